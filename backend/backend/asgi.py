@@ -0,0 +1,12 @@
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+# Представления с AsyncViewSetMixin регистрируются как асинхронные.
+os.environ.setdefault('ASYNC_VIEWS', 'True')
+
+application = get_asgi_application()
+
+# Подключает учёт соединений с базой данных.
+import backend.db  # noqa: E402, F401
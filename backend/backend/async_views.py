@@ -0,0 +1,85 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+from .db import count_reused_connections
+
+_executor = None
+
+
+def keep_connections():
+    """Настраивает поток пула: его соединения с базой данных
+    переиспользуются DB_CONN_MAX_AGE секунд, хотя в режиме ASYNC_VIEWS
+    для остальных потоков CONN_MAX_AGE равен 0.
+    """
+    for connection in connections.all():
+        connection.settings_dict = {
+            **connection.settings_dict,
+            'CONN_MAX_AGE': settings.DB_CONN_MAX_AGE,
+        }
+
+
+def get_executor():
+    """Возвращает общий для процесса пул потоков представлений."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.ASYNC_VIEW_THREADS,
+            thread_name_prefix='async-views',
+            initializer=keep_connections,
+        )
+    return _executor
+
+
+def run_view(view, request, *args, **kwargs):
+    """Выполняет синхронное представление и отрисовывает ответ
+    в потоке пула, закрывая устаревшие соединения этого потока.
+    """
+    close_old_connections()
+    count_reused_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render') and not response.is_rendered:
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+class AsyncViewSetMixin:
+    """
+    Миксин, который при ASYNC_VIEWS регистрирует набор представлений
+    как асинхронное представление Django.
+
+    DRF выполняет представления синхронно, и под ASGI Django запускает
+    каждый запрос в новом потоке, поэтому соединение с базой данных
+    открывается заново для каждого запроса. Асинхронное представление
+    выполняет код DRF в общем пуле из ASYNC_VIEW_THREADS потоков:
+    соединения потоков переиспользуются, а число одновременных
+    запросов к базе данных ограничено размером пула. Пока поток пула
+    не занят, воркер принимает новые запросы и отдаёт ответы медленным
+    клиентам в цикле событий.
+    """
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        if settings.ASYNC_VIEWS:
+            return cls.as_async_view(actions, **initkwargs)
+        return super().as_view(actions, **initkwargs)
+
+    @classmethod
+    def as_async_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+
+        async def async_view(request, *args, **kwargs):
+            return await sync_to_async(
+                run_view, thread_sensitive=False, executor=get_executor()
+            )(view, request, *args, **kwargs)
+
+        async_view.cls = view.cls
+        async_view.initkwargs = view.initkwargs
+        async_view.actions = view.actions
+        async_view.csrf_exempt = True
+        return async_view
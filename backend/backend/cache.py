@@ -0,0 +1,269 @@
+import time
+from hashlib import md5
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import Http404
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date
+from rest_framework import permissions
+from rest_framework.response import Response
+
+
+# Номера версий хранятся ограниченное время, чтобы не накапливать
+# ключи, например, для адресов несуществующих рецептов. Истёкшая
+# версия создаётся заново с новым номером, поэтому зависящие от неё
+# данные лишь перестают читаться.
+VERSION_TIMEOUT = 24 * 60 * 60
+
+
+def get_versions(*names):
+    """Возвращает текущие номера версий с именами names,
+    создавая отсутствующие.
+    """
+    keys = [f'version:{name}' for name in names]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), VERSION_TIMEOUT)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def invalidate_versions(*names):
+    """После фиксации текущей транзакции меняет номера версий
+    с именами names, объявляя устаревшими зависящие от них данные.
+    """
+    if not names:
+        return
+    transaction.on_commit(lambda: cache.set_many(
+        {f'version:{name}': time.time_ns() for name in names},
+        VERSION_TIMEOUT
+    ))
+
+
+class CatalogCache:
+    """
+    Версионированный кэш справочника.
+
+    Номер версии хранится в кэше Django, а данные текущей версии
+    дополнительно хранятся в памяти процесса. Чтобы изменение
+    справочника видели все воркеры gunicorn, кэш должен быть общим
+    для них (CACHE_URL=redis://..., как в infra/docker-compose.yml).
+    Версия - время последнего изменения справочника в наносекундах,
+    поэтому по ней же формируются заголовки ETag и Last-Modified.
+    Методы получения данных принимают уже прочитанную версию, чтобы
+    запрос обращался к кэшу за версией один раз.
+    """
+
+    def __init__(self, name, loader, timeout=None):
+        self.name = name
+        self.loader = loader
+        self.timeout = timeout
+        self._local = (None, None, None)
+
+    @property
+    def version_key(self):
+        return f'catalog:{self.name}:version'
+
+    def data_key(self, version):
+        return f'catalog:{self.name}:{version}'
+
+    def get_version(self):
+        """Возвращает текущую версию справочника."""
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, time.time_ns(), None)
+            version = cache.get(self.version_key)
+        return version
+
+    def invalidate(self):
+        """После фиксации текущей транзакции объявляет устаревшими
+        данные справочника во всех процессах. Если менять версию
+        до фиксации, параллельный запрос может сохранить ещё старые
+        строки под новой версией.
+        """
+        transaction.on_commit(lambda: cache.set(
+            self.version_key, time.time_ns(), None
+        ))
+
+    def _load(self, version=None):
+        if version is None:
+            version = self.get_version()
+        local_version, data, by_id = self._local
+        if local_version != version:
+            data = cache.get(self.data_key(version))
+            if data is None:
+                data = [dict(item) for item in self.loader()]
+                cache.set(self.data_key(version), data, self.timeout)
+            by_id = {item['id']: item for item in data}
+            self._local = (version, data, by_id)
+        return version, data, by_id
+
+    def get(self, version=None):
+        """Возвращает список элементов справочника версии version,
+        по умолчанию текущей.
+        """
+        return self._load(version)[1]
+
+    def get_by_id(self, version=None):
+        """Возвращает словарь {id: элемент} справочника версии version,
+        по умолчанию текущей.
+        """
+        return self._load(version)[2]
+
+    def get_etag(self, version):
+        return f'"{self.name}-{version}"'
+
+    def get_last_modified(self, version):
+        """Возвращает время изменения версии в секундах."""
+        return version // 10 ** 9
+
+
+class CatalogViewMixin:
+    """
+    Миксин для представлений справочников, которые отдают данные
+    из CatalogCache и поддерживают условные запросы по ETag
+    и Last-Modified. Версия справочника читается один раз за запрос,
+    поэтому тело ответа и заголовки относятся к одной версии.
+    """
+    catalog = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.catalog_version = self.catalog.get_version()
+
+    def get_not_modified_response(self):
+        """Возвращает ответ 304, если у клиента актуальная версия."""
+        return get_conditional_response(
+            self.request,
+            etag=self.catalog.get_etag(self.catalog_version),
+            last_modified=self.catalog.get_last_modified(
+                self.catalog_version
+            ),
+        )
+
+    def list(self, request, *args, **kwargs):
+        return self.get_not_modified_response() or Response(
+            self.catalog.get(self.catalog_version)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        not_modified = self.get_not_modified_response()
+        if not_modified:
+            return not_modified
+        lookup = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        try:
+            return Response(
+                self.catalog.get_by_id(self.catalog_version)[int(lookup)]
+            )
+        except (KeyError, ValueError):
+            raise Http404
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """Добавляет к ответу заголовки ETag и Last-Modified."""
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        version = getattr(self, 'catalog_version', None)
+        if (version is not None
+                and request.method in permissions.SAFE_METHODS
+                and response.status_code in (200, 304)):
+            response['ETag'] = self.catalog.get_etag(version)
+            response['Last-Modified'] = http_date(
+                self.catalog.get_last_modified(version)
+            )
+        return response
+
+
+class AnonymousResponseCacheMixin:
+    """
+    Миксин, кэширующий данные ответов анонимным пользователям
+    для действий cache_actions на RESPONSE_CACHE_TIMEOUT секунд.
+
+    Ключ кэша составлен из хоста, пути, упорядоченных параметров
+    запроса и номеров версий из get_cache_versions(), поэтому
+    при изменении данных старые записи просто перестают читаться.
+    Ключ служит и значением ETag, а заголовок Cache-Control разрешает
+    промежуточным прокси кэшировать ответ на RESPONSE_CACHE_MAX_AGE
+    секунд.
+    """
+    cache_actions = ('list', 'retrieve')
+
+    def get_cache_versions(self):
+        """Возвращает номера версий, от которых зависит ответ."""
+        return []
+
+    def use_response_cache(self, request):
+        return (
+            self.action in self.cache_actions
+            and request.method in ('GET', 'HEAD')
+            and request.user.is_anonymous
+        )
+
+    def get_response_cache_key(self, request):
+        params = sorted(
+            (key, value)
+            for key, values in request.query_params.lists()
+            for value in values
+        )
+        raw_key = (
+            f'{request.get_host()}|{request.path}|{urlencode(params)}|'
+            f'{self.get_cache_versions()}'
+        )
+        return f'response:{md5(raw_key.encode()).hexdigest()}'
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.response_cache_key = None
+        if self.use_response_cache(request):
+            self.response_cache_key = self.get_response_cache_key(request)
+
+    def handle_cached(self, handler, request, *args, **kwargs):
+        """Возвращает ответ 304, данные из кэша или ответ handler,
+        данные которого сохраняются в кэше.
+        """
+        if self.response_cache_key is None:
+            return handler(request, *args, **kwargs)
+        not_modified = get_conditional_response(
+            request, etag=f'"{self.response_cache_key}"'
+        )
+        if not_modified:
+            return not_modified
+        timeout = settings.RESPONSE_CACHE_TIMEOUT
+        data = cache.get(self.response_cache_key) if timeout else None
+        if data is not None:
+            return Response(data)
+        response = handler(request, *args, **kwargs)
+        if timeout and response.status_code == 200:
+            cache.set(self.response_cache_key, response.data, timeout)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.handle_cached(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.handle_cached(super().retrieve, request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """Добавляет заголовки ETag, Cache-Control и Vary."""
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if self.action not in self.cache_actions or (
+                request.method not in permissions.SAFE_METHODS
+        ):
+            return response
+        patch_vary_headers(response, ('Authorization', 'Accept'))
+        if getattr(self, 'response_cache_key', None) is None:
+            patch_cache_control(response, private=True)
+        elif response.status_code in (200, 304):
+            response['ETag'] = f'"{self.response_cache_key}"'
+            patch_cache_control(
+                response, public=True,
+                max_age=settings.RESPONSE_CACHE_MAX_AGE
+            )
+        return response
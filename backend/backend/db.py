@@ -0,0 +1,66 @@
+import logging
+from collections import Counter
+
+from django.core.signals import request_finished, request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from prometheus_client import Counter as MetricCounter
+
+logger = logging.getLogger(__name__)
+
+connection_stats = Counter()
+
+# Счётчики отдаются вместе с показателями backend.metrics по адресу
+# /metrics: доля переиспользованных соединений видна во время работы
+# воркера, а не только в журнале при его завершении.
+CONNECTIONS_CREATED = MetricCounter(
+    'foodgram_db_connections_created', 'Number of opened database connections',
+    ['alias']
+)
+CONNECTIONS_REUSED = MetricCounter(
+    'foodgram_db_connections_reused',
+    'Number of requests that used an already open database connection',
+    ['alias']
+)
+
+
+@receiver(connection_created)
+def count_connection(sender, connection, **kwargs):
+    """Считает новые соединения с базой данных в процессе."""
+    connection_stats['created'] += 1
+    CONNECTIONS_CREATED.labels(connection.alias).inc()
+    logger.debug('Opened database connection to %s', connection.alias)
+
+
+@receiver(request_started)
+def count_reused_connections(**kwargs):
+    """Считает соединения потока, оставшиеся открытыми с прошлого
+    запроса. Вызывается после close_old_connections, который закрывает
+    устаревшие соединения, и в потоках пула backend.async_views.
+    """
+    for connection in connections.all(initialized_only=True):
+        if connection.connection is not None:
+            connection_stats['reused'] += 1
+            CONNECTIONS_REUSED.labels(connection.alias).inc()
+
+
+@receiver(request_finished)
+def count_requests(**kwargs):
+    """Считает обработанные запросы, чтобы сравнить их число
+    с количеством открытых соединений.
+    """
+    connection_stats['requests'] += 1
+
+
+def get_connection_stats():
+    """Возвращает счётчики соединений и запросов процесса."""
+    return dict(connection_stats)
+
+
+def warm_up_connections():
+    """Заранее открывает соединения со всеми базами данных,
+    чтобы первый запрос не ждал установки соединения.
+    """
+    for connection in connections.all():
+        connection.ensure_connection()
@@ -0,0 +1,248 @@
+import logging
+import os
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry)
+from prometheus_client import Counter as MetricCounter
+from prometheus_client import generate_latest, multiprocess
+from rest_framework.serializers import BaseSerializer
+
+logger = logging.getLogger(__name__)
+
+UNRESOLVED_VIEW = 'unresolved'
+SLOW_QUERIES_LOGGED = 10
+IN_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+WHITESPACE = re.compile(r'\s+')
+
+# Счётчики хранятся в памяти процесса. Под gunicorn переменная
+# окружения PROMETHEUS_MULTIPROC_DIR (см. gunicorn.conf.py) переводит
+# prometheus_client в режим нескольких процессов: значения каждого
+# воркера пишутся в файлы общего каталога и суммируются при выдаче.
+REQUESTS = MetricCounter(
+    'foodgram_requests', 'Number of requests', ['view']
+)
+REQUEST_SECONDS = MetricCounter(
+    'foodgram_request_seconds', 'Total time spent in requests', ['view']
+)
+DB_QUERIES = MetricCounter(
+    'foodgram_db_queries', 'Number of SQL queries', ['view']
+)
+DB_SECONDS = MetricCounter(
+    'foodgram_db_seconds', 'Total time spent in SQL queries', ['view']
+)
+SERIALIZER_SECONDS = MetricCounter(
+    'foodgram_serializer_seconds', 'Total time spent in serializers',
+    ['view']
+)
+
+current_metrics = ContextVar('current_metrics', default=None)
+
+
+class RequestMetrics:
+    """Показатели одного запроса."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0
+        self.serializer_time = 0
+        self.serializer_depth = 0
+        self.fingerprints = Counter()
+        self.fingerprint_times = Counter()
+
+    @property
+    def total_time(self):
+        return time.perf_counter() - self.started
+
+
+def get_fingerprint(sql):
+    """Приводит запрос к виду без различий в списках IN и пробелах.
+    Значения параметров в sql уже заменены на %s.
+    """
+    return IN_LIST.sub('(...)', WHITESPACE.sub(' ', sql).strip())
+
+
+def record_query(execute, sql, params, many, context):
+    """Обёртка выполнения запросов, учитывающая их время."""
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        fingerprint = get_fingerprint(sql)
+        metrics.queries += 1
+        metrics.db_time += elapsed
+        metrics.fingerprints[fingerprint] += 1
+        metrics.fingerprint_times[fingerprint] += elapsed
+
+
+def install_query_wrapper(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def install_query_wrapper_on_connect(sender, connection, **kwargs):
+    install_query_wrapper(connection)
+
+
+def timed_serializer_data(data_property):
+    """Оборачивает свойство data сериализатора DRF, учитывая время
+    только внешнего сериализатора, без вложенных.
+    """
+
+    def data(self):
+        metrics = current_metrics.get()
+        if metrics is None:
+            return data_property.fget(self)
+        started = time.perf_counter()
+        metrics.serializer_depth += 1
+        try:
+            return data_property.fget(self)
+        finally:
+            metrics.serializer_depth -= 1
+            if not metrics.serializer_depth:
+                metrics.serializer_time += time.perf_counter() - started
+
+    data.timed = True
+    return property(data)
+
+
+def install_metrics():
+    """Подключает учёт SQL-запросов новых соединений и времени
+    сериализаторов DRF. Вызывается при создании промежуточного слоя,
+    поэтому при выключенной настройке REQUEST_METRICS запросы
+    и сериализаторы выполняются без обёрток.
+    """
+    connection_created.connect(
+        install_query_wrapper_on_connect, dispatch_uid=__name__
+    )
+    if not getattr(BaseSerializer.data.fget, 'timed', False):
+        BaseSerializer.data = timed_serializer_data(BaseSerializer.data)
+
+
+def save_metrics(view_name, metrics, total_time):
+    """Увеличивает счётчики представления в памяти процесса."""
+    REQUESTS.labels(view_name).inc()
+    REQUEST_SECONDS.labels(view_name).inc(total_time)
+    DB_QUERIES.labels(view_name).inc(metrics.queries)
+    DB_SECONDS.labels(view_name).inc(metrics.db_time)
+    SERIALIZER_SECONDS.labels(view_name).inc(metrics.serializer_time)
+
+
+def format_server_timing(metrics, total_time):
+    return ', '.join((
+        f'db;dur={metrics.db_time * 1000:.1f};'
+        f'desc="{metrics.queries} queries"',
+        f'serializer;dur={metrics.serializer_time * 1000:.1f}',
+        f'total;dur={total_time * 1000:.1f}',
+    ))
+
+
+def log_slow_request(request, view_name, metrics, total_time):
+    queries = '\n'.join(
+        f'  {count} x {metrics.fingerprint_times[fingerprint] * 1000:.1f} ms:'
+        f' {fingerprint}'
+        for fingerprint, count in sorted(
+            metrics.fingerprints.items(),
+            key=lambda item: metrics.fingerprint_times[item[0]],
+            reverse=True,
+        )[:SLOW_QUERIES_LOGGED]
+    )
+    logger.warning(
+        'Slow request %s %s (%s): %.1f ms, %d queries in %.1f ms, '
+        'serializers %.1f ms\n%s',
+        request.method, request.get_full_path(), view_name,
+        total_time * 1000, metrics.queries, metrics.db_time * 1000,
+        metrics.serializer_time * 1000, queries
+    )
+
+
+class RequestMetricsMiddleware:
+    """
+    Учитывает для каждого запроса количество и время SQL-запросов,
+    время сериализаторов DRF и общее время. Показатели отдаются
+    в заголовке Server-Timing и суммируются по имени представления
+    в счётчиках prometheus_client для представления metrics_view,
+    а запросы дольше SLOW_REQUEST_THRESHOLD миллисекунд записываются
+    в журнал вместе с отпечатками SQL-запросов.
+    Поддерживает асинхронную цепочку обработчиков, чтобы под ASGI
+    не занимать отдельный поток на каждый запрос.
+    Подключается настройкой REQUEST_METRICS.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install_metrics()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        for connection in connections.all(initialized_only=True):
+            install_query_wrapper(connection)
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.process_metrics(request, response, metrics)
+
+    async def __acall__(self, request):
+        """Асинхронный вариант. Представления выполняются в потоках
+        пула с копией контекста, поэтому показатели, записанные там,
+        попадают в тот же объект RequestMetrics.
+        """
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        return self.process_metrics(request, response, metrics)
+
+    def process_metrics(self, request, response, metrics):
+        total_time = metrics.total_time
+        match = request.resolver_match
+        view_name = match.view_name if match else UNRESOLVED_VIEW
+        response['Server-Timing'] = format_server_timing(metrics, total_time)
+        save_metrics(view_name, metrics, total_time)
+        threshold = settings.SLOW_REQUEST_THRESHOLD
+        if threshold and total_time * 1000 >= threshold:
+            log_slow_request(request, view_name, metrics, total_time)
+        return response
+
+
+def get_registry():
+    """Возвращает реестр показателей: в режиме нескольких процессов
+    собирает значения всех воркеров из файлов общего каталога.
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics_view(request):
+    """Отдаёт накопленные показатели в текстовом формате Prometheus.
+    Подключается в backend.urls при включённой настройке REQUEST_METRICS.
+    """
+    return HttpResponse(
+        generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST
+    )
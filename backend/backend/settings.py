@@ -11,6 +11,23 @@ env = environ.Env(
     POSTGRES_PASSWORD=str,
     DB_HOST=str,
     DB_PORT=int,
+    DB_CONN_MAX_AGE=(int, 60),
+    DB_CONN_HEALTH_CHECKS=(bool, True),
+    SHOPPING_CART_PDF_FONT=(str, '/usr/share/fonts/dejavu/DejaVuSans.ttf'),
+    INGREDIENTS_AUTOCOMPLETE_LIMIT=(int, 20),
+    INGREDIENTS_CACHE_MAX_AGE=(int, 300),
+    CACHE_URL=(str, 'locmemcache://'),
+    PAGINATION_COUNT_CACHE_TIMEOUT=(int, 0),
+    PAGINATION_COUNT_ESTIMATE_THRESHOLD=(int, 0),
+    RECIPE_IMAGE_MAX_SIZE=(int, 10 * 1024 * 1024),
+    RESPONSE_CACHE_TIMEOUT=(int, 0),
+    TOKEN_CACHE_TIMEOUT=(int, 300),
+    RESPONSE_CACHE_MAX_AGE=(int, 0),
+    RECIPE_IMAGE_RENDITION_WORKERS=(int, 2),
+    ASYNC_VIEWS=(bool, False),
+    ASYNC_VIEW_THREADS=(int, 8),
+    REQUEST_METRICS=(bool, False),
+    SLOW_REQUEST_THRESHOLD=(int, 1000),
 )
 
 environ.Env.read_env()
@@ -33,6 +50,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'django_filters',
@@ -52,6 +70,14 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Учёт SQL-запросов и времени обработки запросов, см. backend.metrics.
+REQUEST_METRICS = env('REQUEST_METRICS')
+
+SLOW_REQUEST_THRESHOLD = env('SLOW_REQUEST_THRESHOLD')
+
+if REQUEST_METRICS:
+    MIDDLEWARE.insert(0, 'backend.metrics.RequestMetricsMiddleware')
+
 ROOT_URLCONF = 'backend.urls'
 
 
@@ -75,6 +101,15 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'backend.wsgi.application'
 
+ASGI_APPLICATION = 'backend.asgi.application'
+
+# Включается в backend/asgi.py, см. backend.async_views.
+ASYNC_VIEWS = env('ASYNC_VIEWS')
+
+ASYNC_VIEW_THREADS = env('ASYNC_VIEW_THREADS')
+
+DB_CONN_MAX_AGE = env('DB_CONN_MAX_AGE')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -83,9 +118,22 @@ DATABASES = {
         'PASSWORD': env('POSTGRES_PASSWORD'),
         'HOST': env('DB_HOST'),
         'PORT': env('DB_PORT'),
+        # Соединение переиспользуется запросами одного потока воркера
+        # DB_CONN_MAX_AGE секунд (0 - закрывается после каждого запроса)
+        # и проверяется перед первым запросом после простоя. Под ASGI
+        # Django выполняет синхронные представления в новом потоке для
+        # каждого запроса, и их соединения закрываются после запроса,
+        # а DB_CONN_MAX_AGE действует только для потоков пула
+        # backend.async_views.
+        'CONN_MAX_AGE': 0 if ASYNC_VIEWS else DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': env('DB_CONN_HEALTH_CHECKS'),
     }
 }
 
+CACHES = {
+    'default': env.cache('CACHE_URL'),
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -122,11 +170,11 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_PAGINATION_CLASS':
-        'rest_framework.pagination.PageNumberPagination',
+        'recipes.pagination.CustomPagination',
         'PAGE_SIZE': 6,
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-         'rest_framework.authentication.TokenAuthentication',
+         'users.authentication.CachedTokenAuthentication',
     ],
 
     'NON_FIELD_ERRORS_KEY': 'errors',
@@ -161,3 +209,46 @@ DJOSER = {
     },
     'HIDE_USERS': False,
 }
+
+
+SHOPPING_CART_PDF_FONT = env('SHOPPING_CART_PDF_FONT')
+
+
+INGREDIENTS_AUTOCOMPLETE_LIMIT = env('INGREDIENTS_AUTOCOMPLETE_LIMIT')
+
+
+INGREDIENTS_CACHE_MAX_AGE = env('INGREDIENTS_CACHE_MAX_AGE')
+
+
+PAGINATION_COUNT_CACHE_TIMEOUT = env('PAGINATION_COUNT_CACHE_TIMEOUT')
+
+
+PAGINATION_COUNT_ESTIMATE_THRESHOLD = env(
+    'PAGINATION_COUNT_ESTIMATE_THRESHOLD'
+)
+
+
+RESPONSE_CACHE_TIMEOUT = env('RESPONSE_CACHE_TIMEOUT')
+
+
+RESPONSE_CACHE_MAX_AGE = env('RESPONSE_CACHE_MAX_AGE')
+
+
+# Кэш в памяти процесса не общий для воркеров gunicorn: выход
+# или деактивация пользователя не сбросили бы токен в других воркерах.
+TOKEN_CACHE_TIMEOUT = (
+    0 if CACHES['default']['BACKEND'].endswith('.LocMemCache')
+    else env('TOKEN_CACHE_TIMEOUT')
+)
+
+
+RECIPE_IMAGE_MAX_SIZE = env('RECIPE_IMAGE_MAX_SIZE')
+
+
+RECIPE_IMAGE_RENDITION_WORKERS = env('RECIPE_IMAGE_RENDITION_WORKERS')
+
+
+RECIPE_IMAGE_RENDITIONS = {
+    'small': 320,
+    'medium': 960,
+}
@@ -1,7 +1,10 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import include, path
 from django.views.generic import TemplateView
 
+from .metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path(
@@ -18,3 +21,6 @@ urlpatterns = [
     path('api/', include('ingredients.urls')),
     path('api/', include('recipes.urls')),
 ]
+
+if settings.REQUEST_METRICS:
+    urlpatterns.append(path('metrics', metrics_view, name='metrics'))
@@ -5,3 +5,6 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 application = get_wsgi_application()
+
+# Подключает учёт соединений с базой данных.
+import backend.db  # noqa: E402, F401
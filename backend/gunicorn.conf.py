@@ -0,0 +1,83 @@
+import logging
+import multiprocessing
+import os
+import shutil
+from pathlib import Path
+
+import environ
+
+env = environ.Env(
+    GUNICORN_BIND=(str, '0.0.0.0:8000'),
+    GUNICORN_WORKERS=(int, multiprocessing.cpu_count() * 2 + 1),
+    GUNICORN_THREADS=(int, 1),
+    GUNICORN_WORKER_CLASS=(str, ''),
+    GUNICORN_TIMEOUT=(int, 30),
+    GUNICORN_MAX_REQUESTS=(int, 0),
+    GUNICORN_WARMUP=(bool, True),
+    PROMETHEUS_MULTIPROC_DIR=(str, '/tmp/foodgram-metrics'),
+)
+
+environ.Env.read_env(Path(__file__).resolve().parent / 'backend' / '.env')
+
+logger = logging.getLogger('gunicorn.error')
+
+bind = env('GUNICORN_BIND')
+workers = env('GUNICORN_WORKERS')
+# При GUNICORN_THREADS > 1 используется воркер gthread: каждый поток
+# держит своё соединение с базой данных, поэтому число соединений
+# воркера ограничено числом потоков. Для backend.asgi:application
+# задаётся GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker.
+threads = env('GUNICORN_THREADS')
+worker_class = env('GUNICORN_WORKER_CLASS') or (
+    'gthread' if threads > 1 else 'sync'
+)
+timeout = env('GUNICORN_TIMEOUT')
+max_requests = env('GUNICORN_MAX_REQUESTS')
+max_requests_jitter = max_requests // 10
+# Счётчики backend.metrics каждого воркера пишутся в файлы этого
+# каталога, а /metrics суммирует их по всем воркерам. Переменная
+# задаётся до запуска воркеров, чтобы они её унаследовали.
+os.environ['PROMETHEUS_MULTIPROC_DIR'] = env('PROMETHEUS_MULTIPROC_DIR')
+
+
+def on_starting(server):
+    """Очищает каталог счётчиков от файлов прошлого запуска."""
+    metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+
+def post_worker_init(worker):
+    """Открывает соединение с базой данных до первого запроса.
+    Потоки воркера gthread открывают свои соединения сами.
+    """
+    if not env('GUNICORN_WARMUP') or worker_class != 'sync':
+        return
+    from backend.db import warm_up_connections
+
+    try:
+        warm_up_connections()
+    except Exception:
+        logger.exception('Database warmup failed in worker %s', worker.pid)
+
+
+def worker_exit(server, worker):
+    """Записывает в журнал статистику соединений воркера."""
+    from backend.db import get_connection_stats
+
+    stats = get_connection_stats()
+    logger.info(
+        'Worker %s served %s requests with %s database connections, '
+        'reused %s times',
+        worker.pid, stats.get('requests', 0), stats.get('created', 0),
+        stats.get('reused', 0)
+    )
+
+
+def child_exit(server, worker):
+    """Отмечает завершение воркера в файлах счётчиков. Накопленные
+    значения счётчиков воркера при этом сохраняются.
+    """
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,53 @@
+from bisect import bisect_left
+
+from .catalogs import ingredient_catalog
+
+
+class IngredientIndex:
+    """Отсортированный по наименованию справочник ингредиентов
+    в памяти процесса для быстрых подсказок при вводе.
+    Поиск по началу наименования выполняется бинарным поиском,
+    поиск по вхождению - только если совпадений с начала не хватило.
+    """
+
+    def __init__(self, ingredients):
+        self.items = sorted(
+            ((ingredient['name'].lower(), ingredient)
+             for ingredient in ingredients),
+            key=lambda item: item[0]
+        )
+        self.keys = [key for key, _ in self.items]
+
+    def search(self, query, limit):
+        """Возвращает не более limit ингредиентов, наименование которых
+        начинается с query, а затем содержащих query, без учёта регистра.
+        """
+        query = query.lower()
+        results = []
+        position = bisect_left(self.keys, query)
+        while (position < len(self.keys) and len(results) < limit
+               and self.keys[position].startswith(query)):
+            results.append(self.items[position][1])
+            position += 1
+        if len(results) < limit:
+            for key, ingredient in self.items:
+                if query in key and not key.startswith(query):
+                    results.append(ingredient)
+                    if len(results) == limit:
+                        break
+        return results
+
+
+_index = (None, None)
+
+
+def get_ingredient_index(current_version):
+    """Возвращает индекс ингредиентов для версии справочника
+    current_version, перестраивая его после изменения ингредиентов.
+    """
+    global _index
+    version, index = _index
+    if version != current_version:
+        index = IngredientIndex(ingredient_catalog.get(current_version))
+        _index = (current_version, index)
+    return index
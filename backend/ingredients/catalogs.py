@@ -0,0 +1,14 @@
+from backend.cache import CatalogCache
+from .models import Ingredient
+
+
+def load_ingredients():
+    return (
+        {'id': id, 'name': name, 'measurement_unit': measurement_unit}
+        for id, name, measurement_unit in Ingredient.objects.values_list(
+            'id', 'name', 'measurement_unit__name'
+        ).order_by('name', 'id')
+    )
+
+
+ingredient_catalog = CatalogCache('ingredients', load_ingredients)
@@ -1,30 +1,146 @@
 import csv
+import json
+import re
+import time
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
 
+from ingredients.catalogs import ingredient_catalog
 from ingredients.models import Ingredient, Unit
 
+DEFAULT_PATH = settings.BASE_DIR / 'ingredients' / 'data' / 'ingredients.csv'
+BATCH_SIZE = 1000
+CHUNK_SIZE = 64 * 1024
+JSON_SEPARATORS = re.compile(r'[\s,]*')
+
+
+def read_csv(file):
+    """Построчно читает пары (наименование, единица измерения) из CSV."""
+    for row in csv.reader(file):
+        if len(row) != 2:
+            raise CommandError(f'Некорректная строка CSV: {row}')
+        yield row
+
+
+def read_json(file):
+    """Читает пары (наименование, единица измерения) из JSON-массива
+    объектов по частям, не загружая файл в память целиком.
+    """
+    decoder = json.JSONDecoder()
+    buffer = file.read(CHUNK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Файл JSON должен содержать массив объектов.')
+    position = 1
+    while True:
+        position = JSON_SEPARATORS.match(buffer, position).end()
+        if buffer.startswith(']', position):
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                raise CommandError('Некорректный файл JSON.')
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield item['name'], item['measurement_unit']
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
 
 class Command(BaseCommand):
     help = 'Load ingredients data to BD'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=str(DEFAULT_PATH),
+            help='Path to the CSV or JSON file with ingredients.',
+        )
+        parser.add_argument(
+            '--format',
+            choices=READERS,
+            help='File format, detected from the extension by default.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Number of ingredients inserted by one query.',
+        )
+
     def handle(self, *args, **options):
-        """Обрабатывает каждую строку в CSV-файле,
-        создавая записи в базе данных для каждого ингредиента
-        и его единицы измерения.
+        """Читает файл с ингредиентами потоком и добавляет в базу данных
+        отсутствующие единицы измерения и ингредиенты пакетами.
+        Повторный запуск не создаёт дубликатов.
         """
-        with open(
-                'ingredients/data/ingredients.csv',
-                encoding='utf-8'
-        ) as f:
-            reader = csv.reader(f)
-            for row in reader:
-                name, measurement_unit_name = row
-                if len(measurement_unit_name.strip()) == 0:
+        started = time.monotonic()
+        path = options['path']
+        file_format = options['format'] or path.rsplit('.', 1)[-1].lower()
+        if file_format not in READERS:
+            raise CommandError(
+                f'Неизвестный формат файла: {file_format}. '
+                f'Укажите --format csv или --format json.'
+            )
+        ingredients_before = Ingredient.objects.count()
+        self.units = dict(Unit.objects.values_list('name', 'id'))
+        units_before = len(self.units)
+        rows = skipped = 0
+        batch = []
+        with open(path, encoding='utf-8') as file:
+            for name, unit_name in READERS[file_format](file):
+                name, unit_name = name.strip(), unit_name.strip()
+                if not name or not unit_name:
+                    skipped += 1
                     continue
-                measurement_unit, _ = Unit.objects.get_or_create(
-                    name=measurement_unit_name
+                rows += 1
+                batch.append((name, unit_name))
+                if len(batch) >= options['batch_size']:
+                    self.insert(batch)
+                    batch = []
+        self.insert(batch)
+        ingredient_catalog.invalidate()
+        inserted = Ingredient.objects.count() - ingredients_before
+        self.stdout.write(self.style.SUCCESS(
+            f'Read {rows} rows, skipped {skipped}. '
+            f'Inserted {inserted} ingredients '
+            f'and {len(self.units) - units_before} units '
+            f'in {time.monotonic() - started:.2f}s.'
+        ))
+
+    def insert(self, batch):
+        """Добавляет пакет ингредиентов, предварительно создав
+        отсутствующие единицы измерения.
+        """
+        if not batch:
+            return
+        new_units = {
+            unit_name for _, unit_name in batch
+            if unit_name not in self.units
+        }
+        if new_units:
+            Unit.objects.bulk_create(
+                [Unit(name=unit_name) for unit_name in new_units],
+                ignore_conflicts=True,
+            )
+            self.units.update(
+                Unit.objects.filter(name__in=new_units).values_list(
+                    'name', 'id'
                 )
-                Ingredient.objects.get_or_create(
-                    name=name, measurement_unit=measurement_unit
+            )
+        Ingredient.objects.bulk_create(
+            [
+                Ingredient(
+                    name=name, measurement_unit_id=self.units[unit_name]
                 )
+                for name, unit_name in batch
+            ],
+            ignore_conflicts=True,
+        )
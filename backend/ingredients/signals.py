@@ -0,0 +1,19 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .catalogs import ingredient_catalog
+from .models import Ingredient, Unit
+
+
+@receiver((post_save, post_delete), sender=Unit)
+def invalidate_units(**kwargs):
+    """Сбрасывает кэш ингредиентов, в которых хранится
+    наименование единицы измерения.
+    """
+    ingredient_catalog.invalidate()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredients(**kwargs):
+    """Сбрасывает кэш ингредиентов."""
+    ingredient_catalog.invalidate()
@@ -0,0 +1,175 @@
+import json
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from .autocomplete import IngredientIndex
+from .catalogs import ingredient_catalog
+from .models import Ingredient, Unit
+
+User = get_user_model()
+
+
+class IngredientAutocompleteTests(TestCase):
+    """Тесты поиска ингредиентов по наименованию."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='user@example.org',
+            username='user',
+            first_name='Имя',
+            last_name='Фамилия',
+            password='password',
+        )
+        unit = Unit.objects.create(name='г')
+        for name in (
+            'морская соль', 'соль', 'соль крупная', 'сахар', 'фасоль'
+        ):
+            Ingredient.objects.create(name=name, measurement_unit=unit)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_names(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.json()]
+
+    def test_prefix_matches_are_ranked_first(self):
+        """Совпадения с начала строки выводятся раньше вхождений."""
+        self.assertEqual(
+            self.get_names('/api/ingredients/?name=Соль'),
+            ['соль', 'соль крупная', 'морская соль', 'фасоль']
+        )
+
+    @override_settings(INGREDIENTS_AUTOCOMPLETE_LIMIT=2)
+    def test_results_are_limited(self):
+        """Количество подсказок ограничено настройкой."""
+        self.assertEqual(
+            self.get_names('/api/ingredients/?name=соль'),
+            ['соль', 'соль крупная']
+        )
+
+    def test_response_is_cacheable(self):
+        """Ответ содержит заголовок Cache-Control."""
+        response = self.client.get('/api/ingredients/?name=соль')
+        self.assertIn('max-age', response['Cache-Control'])
+
+    def test_search_is_served_from_memory(self):
+        """Повторный поиск не обращается к базе данных."""
+        self.client.get('/api/ingredients/?name=соль')
+        with self.assertNumQueries(0):
+            self.get_names('/api/ingredients/?name=сах')
+
+
+    def test_search_reads_version_once(self):
+        """Поиск читает версию справочника из кэша один раз."""
+        self.get_names('/api/ingredients/?name=соль')
+        with mock.patch.object(
+                ingredient_catalog, 'get_version',
+                wraps=ingredient_catalog.get_version
+        ) as get_version:
+            self.get_names('/api/ingredients/?name=сах')
+        get_version.assert_called_once()
+
+    def test_new_ingredient_is_found(self):
+        """Новый ингредиент сразу попадает в подсказки."""
+        self.get_names('/api/ingredients/?name=соль')
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(
+                name='соль морская', measurement_unit=Unit.objects.get()
+            )
+        self.assertIn(
+            'соль морская', self.get_names('/api/ingredients/?name=соль')
+        )
+
+    def test_ingredient_list_and_detail(self):
+        """Справочник ингредиентов отдаётся целиком и по id."""
+        self.assertEqual(len(self.get_names('/api/ingredients/')), 5)
+        ingredient = Ingredient.objects.get(name='сахар')
+        response = self.client.get(f'/api/ingredients/{ingredient.id}/')
+        self.assertEqual(
+            response.json(),
+            {'id': ingredient.id, 'name': 'сахар', 'measurement_unit': 'г'}
+        )
+
+
+class IngredientIndexTests(TestCase):
+    """Тесты индекса ингредиентов в памяти процесса."""
+
+    def setUp(self):
+        self.index = IngredientIndex(
+            {'id': id, 'name': name, 'measurement_unit': 'г'}
+            for id, name in enumerate(
+                ('Соль', 'сода', 'морская соль', 'солод', 'фасоль')
+            )
+        )
+
+    def search(self, query, limit=10):
+        return [item['name'] for item in self.index.search(query, limit)]
+
+    def test_prefix_then_contains(self):
+        """Совпадения с начала строки идут раньше вхождений."""
+        self.assertEqual(
+            self.search('СОЛ'), ['солод', 'Соль', 'морская соль', 'фасоль']
+        )
+
+    def test_limit(self):
+        """Поиск вхождений не выполняется, если хватило совпадений с начала."""
+        self.assertEqual(self.search('со', limit=2), ['сода', 'солод'])
+
+    def test_no_matches(self):
+        self.assertEqual(self.search('перец'), [])
+
+    def test_duplicate_names(self):
+        """Одинаковые без учёта регистра наименования, которые есть
+        в ingredients.csv, не мешают построить индекс.
+        """
+        index = IngredientIndex([
+            {'id': 1, 'name': 'Соль', 'measurement_unit': 'г'},
+            {'id': 2, 'name': 'соль', 'measurement_unit': 'щепотка'},
+        ])
+        self.assertEqual(
+            [item['id'] for item in index.search('соль', 10)], [1, 2]
+        )
+
+
+class LoadDataTests(TestCase):
+    """Тесты команды загрузки ингредиентов."""
+
+    def load(self, *args):
+        out = StringIO()
+        call_command('load_data', *args, stdout=out)
+        return out.getvalue()
+
+    def test_load_default_csv(self):
+        """Повторная загрузка не создаёт дубликатов."""
+        self.assertIn('Inserted 2188 ingredients', self.load())
+        self.assertEqual(Ingredient.objects.count(), 2188)
+        self.assertIn('Inserted 0 ingredients and 0 units', self.load())
+        self.assertEqual(Ingredient.objects.count(), 2188)
+
+    def test_load_json(self):
+        """JSON-файл читается частями и даёт тот же результат."""
+        data = [
+            {'name': f'ингредиент {i}', 'measurement_unit': f'ед {i % 3}'}
+            for i in range(2000)
+        ]
+        with tempfile.NamedTemporaryFile(
+                'w', suffix='.data', encoding='utf-8'
+        ) as file:
+            json.dump(data, file, ensure_ascii=False, indent=2)
+            file.flush()
+            with self.assertNumQueries(9):
+                self.load(file.name, '--format', 'json', '--batch-size', '500')
+        self.assertEqual(Ingredient.objects.count(), 2000)
+        self.assertEqual(Unit.objects.count(), 3)
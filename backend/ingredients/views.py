@@ -1,18 +1,49 @@
-from django_filters.rest_framework import DjangoFilterBackend
+from django.conf import settings
+from django.utils.cache import patch_cache_control
 from rest_framework import mixins, viewsets
+from rest_framework.response import Response
 
-from .filters import IngredientFilter
+from backend.async_views import AsyncViewSetMixin
+from backend.cache import CatalogViewMixin
+from .autocomplete import get_ingredient_index
+from .catalogs import ingredient_catalog
 from .models import Ingredient
 from .serializers import IngredientSerializer
 
 
 class IngredientViewSet(
+    AsyncViewSetMixin,
+    CatalogViewMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     viewsets.GenericViewSet
 ):
     serializer_class = IngredientSerializer
-    queryset = Ingredient.objects.all()
+    queryset = Ingredient.objects.select_related('measurement_unit')
     pagination_class = None
-    filter_backends = (DjangoFilterBackend,)
-    filterset_class = IngredientFilter
+    catalog = ingredient_catalog
+
+    def list(self, request, *args, **kwargs):
+        """При поиске по наименованию возвращает ограниченный список
+        подсказок из индекса ингредиентов в памяти процесса.
+        """
+        name = request.query_params.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
+        return self.get_not_modified_response() or Response(
+            get_ingredient_index(self.catalog_version).search(
+                name, settings.INGREDIENTS_AUTOCOMPLETE_LIMIT
+            )
+        )
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """Разрешает клиентам кэшировать справочник ингредиентов."""
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if response.status_code == 200:
+            patch_cache_control(
+                response, private=True,
+                max_age=settings.INGREDIENTS_CACHE_MAX_AGE
+            )
+        return response
@@ -1,10 +1,13 @@
 from django.contrib import admin
 
-from .models import Amount, Favorite, Purchase, Recipe, Tag
+from .models import (Amount, Favorite, Purchase, Recipe, ShoppingCartItem,
+                     Tag)
+from .search import update_search_vector
 
 admin.site.register(Amount)
 admin.site.register(Favorite)
 admin.site.register(Purchase)
+admin.site.register(ShoppingCartItem)
 
 
 class AmountInline(admin.TabularInline):
@@ -32,13 +35,28 @@ class RecipeAdmin(admin.ModelAdmin):
     list_display = (
         'name',
         'author',
-        'count_favorites'
+        'count_favorites',
+        'count_in_carts',
     )
     filter_horizontal = ('tags',)
     search_fields = ('author', 'name')
     list_filter = ('author', 'name', 'tags')
 
-    @admin.display(description='добавлений в избранное')
+    def save_related(self, request, form, formsets, change):
+        """После сохранения ингредиентов обновляет поисковый вектор."""
+        super().save_related(request, form, formsets, change)
+        update_search_vector(form.instance)
+
+    @admin.display(
+        description='добавлений в избранное', ordering='favorites_count'
+    )
     def count_favorites(self, recipe):
         """Метод для отображения количества добавлений в избранное."""
-        return recipe.favorites.count()
+        return recipe.favorites_count
+
+    @admin.display(
+        description='добавлений в список покупок', ordering='in_carts_count'
+    )
+    def count_in_carts(self, recipe):
+        """Метод для отображения количества добавлений в список покупок."""
+        return recipe.in_carts_count
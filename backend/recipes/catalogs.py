@@ -0,0 +1,11 @@
+from backend.cache import CatalogCache
+from .models import Tag
+
+
+def load_tags():
+    from .serializers import TagSerializer
+
+    return TagSerializer(Tag.objects.all(), many=True).data
+
+
+tag_catalog = CatalogCache('tags', load_tags)
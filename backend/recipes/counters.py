@@ -0,0 +1,60 @@
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Favorite, Purchase, Recipe
+
+COUNTERS = {
+    Favorite: 'favorites_count',
+    Purchase: 'in_carts_count',
+}
+
+
+def change_recipe_counter(model, recipe_id, delta):
+    """Атомарно изменяет счётчик рецепта, соответствующий модели model,
+    запросом UPDATE с F(), не опуская его ниже нуля.
+    """
+    counter = COUNTERS[model]
+    recipes = Recipe.objects.filter(pk=recipe_id)
+    if delta < 0:
+        recipes = recipes.filter(**{f'{counter}__gte': -delta})
+    recipes.update(**{counter: F(counter) + delta})
+
+
+def get_actual_count(model):
+    """Возвращает подзапрос с количеством строк model для рецепта."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(
+                recipe=OuterRef('pk')
+            ).order_by().values('recipe').annotate(
+                total=Count('pk')
+            ).values('total')
+        ),
+        0
+    )
+
+
+def get_stale_recipes():
+    """Возвращает рецепты, счётчики которых расходятся
+    с фактическим количеством строк избранного и покупок.
+    """
+    actual = {
+        f'actual_{counter}': get_actual_count(model)
+        for model, counter in COUNTERS.items()
+    }
+    stale = Q()
+    for counter in COUNTERS.values():
+        stale |= ~Q(**{counter: F(f'actual_{counter}')})
+    return Recipe.objects.annotate(**actual).filter(stale)
+
+
+def rebuild_recipe_counters(recipes=None):
+    """Пересчитывает счётчики рецептов одним запросом UPDATE.
+    Возвращает количество обновлённых рецептов.
+    """
+    if recipes is None:
+        recipes = Recipe.objects.all()
+    return recipes.update(**{
+        counter: get_actual_count(model)
+        for model, counter in COUNTERS.items()
+    })
@@ -1,6 +1,40 @@
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
 
-from .models import Recipe, Tag
+from .catalogs import tag_catalog
+from .models import POPULAR_ORDERING, Favorite, Purchase, Recipe
+from .search import search_recipes
+
+
+def get_tag_choices():
+    """Возвращает варианты слагов тегов из кэша справочника."""
+    return [(tag['slug'], tag['name']) for tag in tag_catalog.get()]
+
+
+class TagsFilter(filters.MultipleChoiceFilter):
+    """
+    Фильтр рецептов по нескольким слагам тегов.
+    Слаги проверяются по кэшу справочника тегов, а рецепты отбираются
+    одним подзапросом EXISTS к промежуточной таблице рецептов и тегов,
+    поэтому рецепт с несколькими подходящими тегами не дублируется.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('choices', get_tag_choices)
+        super().__init__(*args, **kwargs)
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+        slugs = set(value)
+        tag_ids = [
+            tag['id'] for tag in tag_catalog.get() if tag['slug'] in slugs
+        ]
+        return qs.filter(Exists(
+            Recipe.tags.through.objects.filter(
+                recipe_id=OuterRef('pk'), tag_id__in=tag_ids
+            )
+        ))
 
 
 class RecipeFilter(filters.FilterSet):
@@ -14,28 +48,59 @@ class RecipeFilter(filters.FilterSet):
         lookup_expr='exact'
     )
 
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all(),
-    )
+    tags = TagsFilter()
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(
+        choices=(('popular', 'По популярности'),),
+        method='filter_ordering'
+    )
 
     class Meta:
         model = Recipe
-        fields = ['author', 'tags', 'is_favorited', 'is_in_shopping_cart']
+        fields = [
+            'author', 'tags', 'is_favorited', 'is_in_shopping_cart',
+            'search', 'ordering'
+        ]
+
+    def filter_by_user_relation(self, queryset, model, value):
+        """Оставляет рецепты, связанные с текущим пользователем
+        через модель model, подзапросом EXISTS.
+        """
+        if not value:
+            return queryset
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset.none()
+        return queryset.filter(Exists(
+            model.objects.filter(user=user, recipe=OuterRef('pk'))
+        ))
 
-    def filter_is_favorited(self, queryset, *args):
+    def filter_is_favorited(self, queryset, name, value):
         """Фильтрует рецепты, которые были добавлены
         в избранное текущим пользователем.
         """
-        return queryset.filter(favorites__user=self.request.user)
+        return self.filter_by_user_relation(queryset, Favorite, value)
 
-    def filter_is_in_shopping_cart(self, queryset, *args):
+    def filter_is_in_shopping_cart(self, queryset, name, value):
         """Фильтрует рецепты, которые находятся
         в списке покупок текущего пользователя.
         """
-        return queryset.filter(purchases__user=self.request.user)
+        return self.filter_by_user_relation(queryset, Purchase, value)
+
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск по названию, описанию и ингредиентам
+        рецепта с сортировкой по релевантности.
+        """
+        if not value.strip():
+            return queryset
+        return search_recipes(queryset, value)
+
+    def filter_ordering(self, queryset, name, value):
+        """Сортирует рецепты по количеству добавлений в избранное
+        и в списки покупок.
+        """
+        return queryset.order_by(*POPULAR_ORDERING)
@@ -0,0 +1,200 @@
+import logging
+import re
+from base64 import b64decode
+from binascii import Error as BinasciiError
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import PurePosixPath
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
+from django.db import connection, transaction
+from django.template.defaultfilters import filesizeformat
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image, ImageOps
+from rest_framework import serializers
+
+from backend.cache import invalidate_versions
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS_DIR = 'recipes/renditions'
+RENDITION_FORMATS = {
+    'webp': 'WEBP',
+    'jpeg': 'JPEG',
+}
+RENDITION_QUALITY = 85
+BASE64_HEADER_SEPARATOR = ';base64,'
+BASE64_CHUNK_SIZE = 64 * 1024
+WHITESPACE = re.compile(r'\s+')
+
+_executor = None
+
+
+class RecipeImageField(Base64ImageField):
+    """
+    Поле изображения рецепта: строка base64 или файл из формы
+    multipart/form-data. Размер проверяется до декодирования,
+    а строка base64 декодируется частями во временный файл,
+    поэтому декодированное изображение целиком в памяти не хранится.
+    """
+
+    def check_size(self, size):
+        if size > settings.RECIPE_IMAGE_MAX_SIZE:
+            raise serializers.ValidationError(
+                'Размер изображения не должен превышать '
+                f'{filesizeformat(settings.RECIPE_IMAGE_MAX_SIZE)}.'
+            )
+
+    def decode_to_file(self, encoded):
+        """Декодирует строку base64 частями во временный файл.
+        Переносы строк удаляются заранее: иначе части строки
+        не выровнены по 4 символа и не декодируются по отдельности.
+        """
+        if WHITESPACE.search(encoded):
+            encoded = WHITESPACE.sub('', encoded)
+        file = TemporaryUploadedFile('image', None, 0, None)
+        try:
+            for start in range(0, len(encoded), BASE64_CHUNK_SIZE):
+                file.write(b64decode(
+                    encoded[start:start + BASE64_CHUNK_SIZE], validate=True
+                ))
+            file.size = file.tell()
+            file.seek(0)
+            image_format = Image.open(file).format
+            file.seek(0)
+        except (BinasciiError, ValueError, OSError):
+            file.close()
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        extension = 'jpg' if image_format == 'JPEG' else image_format.lower()
+        if extension not in self.ALLOWED_TYPES:
+            file.close()
+            raise serializers.ValidationError(self.INVALID_TYPE_MESSAGE)
+        file.name = f'{uuid4()}.{extension}'
+        return file
+
+    def to_internal_value(self, data):
+        if data in self.EMPTY_VALUES:
+            return None
+        if isinstance(data, UploadedFile):
+            self.check_size(data.size)
+            return serializers.ImageField.to_internal_value(self, data)
+        if not isinstance(data, str):
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        encoded = data.partition(BASE64_HEADER_SEPARATOR)[2] or data
+        self.check_size(len(encoded) * 3 // 4)
+        return serializers.ImageField.to_internal_value(
+            self, self.decode_to_file(encoded)
+        )
+
+
+def get_executor():
+    """Возвращает общий для процесса пул потоков обработки изображений."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.RECIPE_IMAGE_RENDITION_WORKERS,
+            thread_name_prefix='recipe-renditions',
+        )
+    return _executor
+
+
+def get_rendition_name(image_name, size_name, extension):
+    return (
+        f'{RENDITIONS_DIR}/{PurePosixPath(image_name).stem}'
+        f'_{size_name}.{extension}'
+    )
+
+
+def make_renditions(image_name):
+    """Создаёт уменьшенные копии изображения в форматах WebP и JPEG
+    для каждого размера из RECIPE_IMAGE_RENDITIONS.
+    Возвращает словарь для поля Recipe.renditions.
+    """
+    storage = Recipe._meta.get_field('image').storage
+    with storage.open(image_name) as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+        image.load()
+    renditions = {'source': image_name}
+    for size_name, size in settings.RECIPE_IMAGE_RENDITIONS.items():
+        resized = image.copy()
+        resized.thumbnail((size, size))
+        renditions[size_name] = {}
+        for extension, image_format in RENDITION_FORMATS.items():
+            if image_format == 'JPEG' and resized.mode != 'RGB':
+                resized = resized.convert('RGB')
+            buffer = BytesIO()
+            resized.save(buffer, image_format, quality=RENDITION_QUALITY)
+            renditions[size_name][extension] = storage.save(
+                get_rendition_name(image_name, size_name, extension),
+                ContentFile(buffer.getvalue()),
+            )
+    return renditions
+
+
+def process_recipe_image(recipe_id, image_name):
+    """Строит уменьшенные копии изображения рецепта и сохраняет их,
+    если изображение рецепта за это время не изменилось.
+    """
+    try:
+        renditions = make_renditions(image_name)
+    except Exception:
+        logger.exception(
+            'Failed to build renditions for recipe %s', recipe_id
+        )
+        return
+    if Recipe.objects.filter(pk=recipe_id, image=image_name).update(
+            renditions=renditions
+    ):
+        invalidate_versions('recipes:list', f'recipes:{recipe_id}')
+
+
+def process_recipe_image_in_worker(recipe_id, image_name):
+    try:
+        process_recipe_image(recipe_id, image_name)
+    finally:
+        connection.close()
+
+
+def schedule_renditions(recipe):
+    """После фиксации транзакции ставит построение уменьшенных копий
+    изображения рецепта в очередь пула потоков. При нулевом
+    RECIPE_IMAGE_RENDITION_WORKERS копии строятся сразу.
+    """
+    if not recipe.image or (
+            recipe.renditions.get('source') == recipe.image.name
+    ):
+        return
+    recipe_id, image_name = recipe.pk, recipe.image.name
+
+    def submit():
+        if settings.RECIPE_IMAGE_RENDITION_WORKERS:
+            get_executor().submit(
+                process_recipe_image_in_worker, recipe_id, image_name
+            )
+        else:
+            process_recipe_image(recipe_id, image_name)
+
+    transaction.on_commit(submit)
+
+
+def get_image_renditions(recipe):
+    """Возвращает URL уменьшенных копий текущего изображения рецепта
+    в виде {размер: {формат: URL}} или пустой словарь, если копии
+    ещё не построены.
+    """
+    renditions = recipe.renditions or {}
+    if not recipe.image or renditions.get('source') != recipe.image.name:
+        return {}
+    storage = recipe.image.storage
+    return {
+        size_name: {
+            extension: storage.url(name)
+            for extension, name in renditions[size_name].items()
+        }
+        for size_name in settings.RECIPE_IMAGE_RENDITIONS
+        if size_name in renditions
+    }
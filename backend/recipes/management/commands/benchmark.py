@@ -0,0 +1,260 @@
+import json
+import statistics
+import time
+from base64 import b64encode
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext, override_settings
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import Purchase, Recipe, Tag
+from users.models import Subscription
+
+User = get_user_model()
+
+ITERATIONS = 20
+TRANSACTION_QUERIES = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE')
+
+
+def get_image():
+    buffer = BytesIO()
+    Image.new('RGB', (300, 200), 'white').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = 'Measure API response times and query counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations', type=int, default=ITERATIONS,
+            help='Number of timed requests per scenario.',
+        )
+        parser.add_argument(
+            '--scenario', action='append', dest='scenarios',
+            help='Run only the given scenario.',
+        )
+        parser.add_argument(
+            '--output',
+            help='Write JSON results to the file instead of stdout.',
+        )
+        parser.add_argument(
+            '--compare',
+            help='JSON results of a previous run to compare with.',
+        )
+
+    def get_scenarios(self):
+        """Возвращает сценарии: имя, клиент, метод, адрес, данные
+        и допустимое количество SQL-запросов.
+        """
+        user = self.user
+        recipe = Recipe.objects.order_by('-favorites_count').first()
+        tags = list(Tag.objects.values_list('slug', flat=True)[:2])
+        word = recipe.name.split()[0]
+        pages = max(1, Recipe.objects.count() // 6)
+        anonymous, client = APIClient(), APIClient()
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        ingredient_ids = list(
+            recipe.amount_ingredients.values_list('ingredient_id', flat=True)
+        )
+        recipe_data = {
+            'ingredients': [
+                {'id': ingredient_id, 'amount': 10}
+                for ingredient_id in ingredient_ids
+            ],
+            'tags': list(recipe.tags.values_list('id', flat=True)),
+            'image': f'data:image/png;base64,{b64encode(self.image).decode()}',
+            'name': 'Рецепт для замера',
+            'text': 'Описание',
+            'cooking_time': 10,
+        }
+        tags_query = '&'.join(f'tags={slug}' for slug in tags)
+        scenarios = [
+            ('feed_anonymous', anonymous, 'get', '/api/recipes/', None, 4),
+            ('feed', client, 'get', '/api/recipes/', None, 5),
+            ('feed_deep_page', client, 'get',
+             f'/api/recipes/?page={pages // 2 or 1}', None, 5),
+            ('feed_cursor', client, 'get',
+             '/api/recipes/?pagination=cursor', None, 4),
+            ('feed_popular', client, 'get',
+             '/api/recipes/?ordering=popular', None, 5),
+            ('detail', client, 'get', f'/api/recipes/{recipe.id}/', None, 4),
+            ('filter_tags', client, 'get',
+             f'/api/recipes/?{tags_query}', None, 5),
+            ('filter_author', client, 'get',
+             f'/api/recipes/?author={recipe.author_id}', None, 5),
+            ('filter_favorited', client, 'get',
+             '/api/recipes/?is_favorited=1', None, 5),
+            ('filter_in_cart', client, 'get',
+             '/api/recipes/?is_in_shopping_cart=1', None, 5),
+            ('search', client, 'get', f'/api/recipes/?search={word}', None, 5),
+            ('subscriptions', client, 'get',
+             '/api/users/subscriptions/?recipes_limit=3', None, 4),
+            ('download_shopping_cart', client, 'get',
+             '/api/recipes/download_shopping_cart/', None, 1),
+            ('recipe_create', client, 'post', '/api/recipes/',
+             recipe_data, 15),
+        ]
+        # Без кэша токенов каждый запрос с токеном проверяет его в базе.
+        token_queries = 0 if settings.TOKEN_CACHE_TIMEOUT else 1
+        return [
+            (name, client, method, url, data,
+             max_queries + (token_queries if client is not anonymous else 0))
+            for name, client, method, url, data, max_queries in scenarios
+        ]
+
+    def get_user(self):
+        """Возвращает пользователя с наибольшим числом подписок,
+        у которого есть рецепты в списке покупок.
+        """
+        subscriber = Subscription.objects.filter(
+            subscriber__in=Purchase.objects.values('user')
+        ).values('subscriber').annotate(
+            total=Count('id')
+        ).order_by('-total').first()
+        if subscriber is None:
+            raise CommandError(
+                'No users with subscriptions and a shopping cart, '
+                'run seed_data first.'
+            )
+        return User.objects.get(pk=subscriber['subscriber'])
+
+    def delete_image(self):
+        """Удаляет файл изображения, сохранённый сценарием создания
+        рецепта: транзакция откатывается, а файл в MEDIA_ROOT остаётся.
+        """
+        storage = Recipe._meta.get_field('image').storage
+        if (not self.image_existed and storage.exists(self.image_name)
+                and not Recipe.objects.filter(
+                    image=self.image_name
+                ).exists()):
+            storage.delete(self.image_name)
+
+    def request(self, client, method, url, data):
+        """Выполняет запрос, полностью читая ответ. Запросы на запись
+        выполняются в транзакции, которая затем откатывается.
+        """
+        with transaction.atomic():
+            started = time.perf_counter()
+            response = getattr(client, method)(url, data, format='json')
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+            transaction.set_rollback(method != 'get')
+        return response, elapsed
+
+    def run_scenario(self, client, method, url, data, iterations):
+        self.request(client, method, url, data)
+        timings, queries = [], 0
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as context:
+                response, elapsed = self.request(client, method, url, data)
+            if response.status_code >= 400:
+                raise CommandError(
+                    f'{method.upper()} {url} returned {response.status_code}.'
+                )
+            timings.append(elapsed * 1000)
+            # Запросы управления транзакцией добавлены замером.
+            queries = max(queries, len([
+                query for query in context.captured_queries
+                if not query['sql'].startswith(TRANSACTION_QUERIES)
+            ]))
+        return {
+            'url': url,
+            'queries': queries,
+            'min_ms': round(min(timings), 2),
+            'median_ms': round(statistics.median(timings), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+            'max_ms': round(max(timings), 2),
+        }
+
+    @override_settings(ALLOWED_HOSTS=['*'])
+    def handle(self, *args, **options):
+        """Выполняет сценарии запросов к API на текущей базе данных,
+        например заполненной командой seed_data, и выводит время
+        ответов и количество SQL-запросов в формате JSON. Изменения
+        в базе данных откатываются, а изображение, которое сценарий
+        создания рецепта сохраняет в MEDIA_ROOT, удаляется.
+        Завершается ошибкой, если сценарий выполнил больше запросов,
+        чем для него допустимо.
+        """
+        self.user = self.get_user()
+        self.image = get_image()
+        storage = Recipe._meta.get_field('image').storage
+        self.image_name = storage.get_content_name(
+            Recipe._meta.get_field('image').generate_filename(
+                None, 'benchmark.png'
+            ),
+            ContentFile(self.image)
+        )
+        self.image_existed = storage.exists(self.image_name)
+        results = {
+            'dataset': {
+                'users': User.objects.count(),
+                'recipes': Recipe.objects.count(),
+            },
+            'iterations': options['iterations'],
+            'scenarios': {},
+        }
+        failures = []
+        try:
+            for name, client, method, url, data, max_queries in (
+                    self.get_scenarios()):
+                if options['scenarios'] and name not in options['scenarios']:
+                    continue
+                result = self.run_scenario(
+                    client, method, url, data, options['iterations']
+                )
+                result['max_queries'] = max_queries
+                results['scenarios'][name] = result
+                if result['queries'] > max_queries:
+                    failures.append(
+                        f'{name}: {result["queries"]} queries, '
+                        f'expected at most {max_queries}'
+                    )
+        finally:
+            self.delete_image()
+        output = json.dumps(results, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+        if options['compare']:
+            self.compare(results, options['compare'])
+        if failures:
+            raise CommandError('\n'.join(failures))
+
+    def compare(self, results, path):
+        """Выводит изменение медианного времени и количества запросов
+        относительно предыдущего запуска.
+        """
+        with open(path, encoding='utf-8') as file:
+            baseline = json.load(file)['scenarios']
+        for name, result in results['scenarios'].items():
+            if name not in baseline:
+                continue
+            before = baseline[name]
+            change = (
+                (result['median_ms'] - before['median_ms'])
+                / before['median_ms'] * 100 if before['median_ms'] else 0
+            )
+            self.stderr.write(
+                f'{name}: {before["median_ms"]} -> {result["median_ms"]} ms '
+                f'({change:+.1f}%), queries {before["queries"]} -> '
+                f'{result["queries"]}'
+            )
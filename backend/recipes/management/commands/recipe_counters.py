@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.counters import get_stale_recipes, rebuild_recipe_counters
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Verify or rebuild recipe favorites and shopping cart counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Recalculate the counters that are out of date.',
+        )
+
+    def handle(self, *args, **options):
+        """Сравнивает счётчики рецептов с фактическим количеством
+        добавлений в избранное и списки покупок и при необходимости
+        пересчитывает расходящиеся.
+        """
+        stale = get_stale_recipes()
+        if options['rebuild']:
+            updated = rebuild_recipe_counters(
+                Recipe.objects.filter(pk__in=stale.values('pk'))
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'Rebuilt counters of {updated} recipes.'
+            ))
+            return
+        mismatches = list(stale.values_list(
+            'id', 'favorites_count', 'actual_favorites_count',
+            'in_carts_count', 'actual_in_carts_count',
+        ))
+        for recipe_id, favorites, actual_favorites, carts, actual_carts in (
+                mismatches[:20]):
+            self.stdout.write(
+                f'recipe={recipe_id}: '
+                f'favorites stored={favorites} expected={actual_favorites}, '
+                f'carts stored={carts} expected={actual_carts}'
+            )
+        if mismatches:
+            raise CommandError(
+                f'{len(mismatches)} recipe counters are out of date, '
+                f'run with --rebuild.'
+            )
+        self.stdout.write(self.style.SUCCESS('Recipe counters are up to date.'))
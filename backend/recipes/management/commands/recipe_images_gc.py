@@ -0,0 +1,76 @@
+import posixpath
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.models import Recipe
+
+IMAGES_DIR = 'recipes'
+MIN_AGE = 24 * 60 * 60
+
+
+def walk_files(storage, path):
+    """Перечисляет имена всех файлов каталога хранилища и его подкаталогов."""
+    directories, files = storage.listdir(path)
+    for file_name in files:
+        yield posixpath.join(path, file_name)
+    for directory in directories:
+        yield from walk_files(storage, posixpath.join(path, directory))
+
+
+def get_referenced_names():
+    """Возвращает имена изображений рецептов и их уменьшенных копий."""
+    names = set()
+    recipes = Recipe.objects.exclude(image='').values_list(
+        'image', 'renditions'
+    )
+    for image, renditions in recipes.iterator():
+        names.add(image)
+        for formats in renditions.values():
+            if isinstance(formats, dict):
+                names.update(formats.values())
+    return names
+
+
+class Command(BaseCommand):
+    help = 'Delete recipe images that are not used by any recipe'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=MIN_AGE,
+            help='Keep files modified less than this many seconds ago.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report the files that would be deleted.',
+        )
+
+    def handle(self, *args, **options):
+        """Удаляет файлы изображений, на которые не ссылается ни один
+        рецепт. Недавно изменённые файлы не удаляются: они могут
+        принадлежать рецепту, транзакция которого ещё не завершена.
+        """
+        storage = Recipe._meta.get_field('image').storage
+        if not storage.exists(IMAGES_DIR):
+            return
+        referenced = get_referenced_names()
+        modified_before = timezone.now() - timedelta(
+            seconds=options['min_age']
+        )
+        deleted = freed = 0
+        for name in walk_files(storage, IMAGES_DIR):
+            if (name in referenced
+                    or storage.get_modified_time(name) > modified_before):
+                continue
+            freed += storage.size(name)
+            if not options['dry_run']:
+                storage.delete(name)
+            deleted += 1
+        action = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} {deleted} files, {freed} bytes.'
+        ))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import process_recipe_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Build missing image renditions of recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Rebuild renditions of every recipe.',
+        )
+
+    def handle(self, *args, **options):
+        """Строит уменьшенные копии изображений рецептов, для которых
+        они отсутствуют или построены по прежнему изображению,
+        например после перезапуска процесса с очередью задач.
+        """
+        recipes = Recipe.objects.exclude(image='').only(
+            'id', 'image', 'renditions'
+        )
+        built = 0
+        for recipe in recipes.iterator():
+            if (options['all']
+                    or recipe.renditions.get('source') != recipe.image.name):
+                process_recipe_image(recipe.id, recipe.image.name)
+                built += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Built renditions for {built} recipes.'
+        ))
@@ -0,0 +1,256 @@
+import random
+import time
+from io import BytesIO, StringIO
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from PIL import Image
+
+from backend.cache import invalidate_versions
+from ingredients.catalogs import ingredient_catalog
+from ingredients.models import Ingredient, Unit
+from recipes.catalogs import tag_catalog
+from recipes.counters import rebuild_recipe_counters
+from recipes.models import Amount, Favorite, Purchase, Recipe, Tag
+from recipes.search import update_search_vector
+from users.models import Subscription
+
+User = get_user_model()
+
+BATCH_SIZE = 1000
+SYNTHETIC_INGREDIENTS = 1000
+DISHES = (
+    'Салат', 'Суп', 'Рагу', 'Запеканка', 'Пирог', 'Омлет', 'Паста',
+    'Каша', 'Плов', 'Оладьи', 'Соус', 'Жаркое',
+)
+WORDS = (
+    'нарезать', 'смешать', 'обжарить', 'посолить', 'добавить', 'варить',
+    'запекать', 'перемешать', 'остудить', 'подавать', 'минут', 'огонь',
+)
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with reproducible synthetic data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--tags', type=int, default=6)
+        parser.add_argument(
+            '--min-ingredients', type=int, default=3,
+            help='Minimum number of ingredients in a recipe.',
+        )
+        parser.add_argument(
+            '--max-ingredients', type=int, default=12,
+            help='Maximum number of ingredients in a recipe.',
+        )
+        parser.add_argument(
+            '--favorites', type=int, default=10,
+            help='Average number of favorite recipes per user.',
+        )
+        parser.add_argument(
+            '--carts', type=int, default=3,
+            help='Average number of recipes in a shopping cart.',
+        )
+        parser.add_argument(
+            '--subscriptions', type=int, default=5,
+            help='Average number of subscriptions per user.',
+        )
+        parser.add_argument('--password', default='password')
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Random seed, the same seed produces the same data.',
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        """Создаёт пользователей, рецепты, теги, избранное, списки
+        покупок и подписки. Авторы выбираются по закону Ципфа: немногие
+        пользователи публикуют большую часть рецептов. Пересчитывает
+        производные данные: счётчики, поисковые векторы и суммы списков
+        покупок.
+        """
+        started = time.monotonic()
+        if options['min_ingredients'] > options['max_ingredients']:
+            raise CommandError(
+                '--min-ingredients must not exceed --max-ingredients.'
+            )
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        users = self.create_users(options['users'], options['password'])
+        tags = self.create_tags(options['tags'])
+        ingredients = self.get_ingredients()
+        if len(ingredients) < options['max_ingredients']:
+            raise CommandError(
+                'Not enough ingredients for --max-ingredients.'
+            )
+        recipes = self.create_recipes(
+            users, tags, ingredients, options['recipes'],
+            options['min_ingredients'], options['max_ingredients'],
+        )
+        self.create_relations(
+            Favorite, users, recipes, options['favorites'], 'user', 'recipe'
+        )
+        self.create_relations(
+            Purchase, users, recipes, options['carts'], 'user', 'recipe'
+        )
+        self.create_relations(
+            Subscription, users, users, options['subscriptions'],
+            'subscriber', 'subscription'
+        )
+        new_recipes = Recipe.objects.filter(pk__in=recipes)
+        rebuild_recipe_counters(new_recipes)
+        update_search_vector(new_recipes)
+        call_command('shopping_cart_totals', rebuild=True, stdout=StringIO())
+        tag_catalog.invalidate()
+        ingredient_catalog.invalidate()
+        invalidate_versions('recipes', 'recipes:list', 'recipes:popular')
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {len(users)} users and {len(recipes)} recipes '
+            f'in {time.monotonic() - started:.2f}s.'
+        ))
+
+    def create_users(self, count, password):
+        start = User.objects.count()
+        password = make_password(password)
+        users = [
+            User(
+                email=f'bench{number}@example.org',
+                username=f'bench{number}',
+                first_name='Имя',
+                last_name=f'Фамилия {number}',
+                password=password,
+            )
+            for number in range(start, start + count)
+        ]
+        User.objects.bulk_create(users, batch_size=self.batch_size)
+        return [user.pk for user in users]
+
+    def create_tags(self, count):
+        """Дополняет теги до count штук."""
+        Tag.objects.bulk_create(
+            [
+                Tag(
+                    name=f'Тег {number}',
+                    color=f'#{0xB00000 + number:06X}',
+                    slug=f'bench-tag-{number}',
+                )
+                for number in range(Tag.objects.count(), count)
+            ],
+            ignore_conflicts=True,
+        )
+        return list(Tag.objects.order_by('pk').values_list('pk', flat=True))
+
+    def get_ingredients(self):
+        """Возвращает ингредиенты справочника, создавая синтетические,
+        если справочник пуст.
+        """
+        ingredients = Ingredient.objects.order_by('pk').values_list(
+            'pk', 'name'
+        )
+        if ingredients.exists():
+            return list(ingredients)
+        unit, _ = Unit.objects.get_or_create(name='г')
+        Ingredient.objects.bulk_create(
+            [
+                Ingredient(name=f'ингредиент {number}', measurement_unit=unit)
+                for number in range(SYNTHETIC_INGREDIENTS)
+            ],
+            batch_size=self.batch_size,
+        )
+        return list(ingredients)
+
+    def get_image(self):
+        """Сохраняет одно изображение для всех рецептов."""
+        buffer = BytesIO()
+        Image.new('RGB', (600, 400), 'white').save(buffer, format='PNG')
+        field = Recipe._meta.get_field('image')
+        return field.storage.save(
+            field.generate_filename(None, 'seed.png'),
+            ContentFile(buffer.getvalue()),
+        )
+
+    def create_recipes(self, users, tags, ingredients, count,
+                       min_ingredients, max_ingredients):
+        rng = self.rng
+        image = self.get_image()
+        cum_weights = list(accumulate(
+            1 / rank for rank in range(1, len(users) + 1)
+        ))
+        recipe_ids = []
+        for start in range(0, count, self.batch_size):
+            size = min(self.batch_size, count - start)
+            recipe_ingredients = [
+                rng.sample(
+                    ingredients, rng.randint(min_ingredients, max_ingredients)
+                )
+                for _ in range(size)
+            ]
+            recipes = [
+                Recipe(
+                    author_id=author_id,
+                    name=(
+                        f'{rng.choice(DISHES)} №{start + number} '
+                        f'с {items[0][1]}'
+                    )[:200],
+                    text=' '.join(rng.choices(WORDS, k=rng.randint(10, 60))),
+                    cooking_time=rng.randint(5, 180),
+                    image=image,
+                )
+                for number, (author_id, items) in enumerate(zip(
+                    rng.choices(users, cum_weights=cum_weights, k=size),
+                    recipe_ingredients,
+                ))
+            ]
+            Recipe.objects.bulk_create(recipes)
+            Amount.objects.bulk_create(
+                [
+                    Amount(
+                        recipe=recipe,
+                        ingredient_id=ingredient_id,
+                        amount=rng.randint(1, 500),
+                    )
+                    for recipe, items in zip(recipes, recipe_ingredients)
+                    for ingredient_id, _ in items
+                ],
+                batch_size=self.batch_size,
+            )
+            Recipe.tags.through.objects.bulk_create(
+                [
+                    Recipe.tags.through(recipe=recipe, tag_id=tag_id)
+                    for recipe in recipes
+                    for tag_id in rng.sample(
+                        tags, rng.randint(1, min(3, len(tags)))
+                    )
+                ],
+                batch_size=self.batch_size,
+            )
+            recipe_ids += [recipe.pk for recipe in recipes]
+        return recipe_ids
+
+    def create_relations(self, model, users, targets, average,
+                         user_field, target_field):
+        """Создаёт для каждого пользователя в среднем average связей
+        со случайными объектами targets, исключая его самого.
+        """
+        rng = self.rng
+        objects = []
+        for user_id in users:
+            count = min(rng.randint(0, average * 2), len(targets) - 1)
+            for target_id in rng.sample(targets, count):
+                if target_id == user_id and model is Subscription:
+                    continue
+                objects.append(model(**{
+                    f'{user_field}_id': user_id,
+                    f'{target_field}_id': target_id,
+                }))
+            if len(objects) >= self.batch_size:
+                model.objects.bulk_create(objects, ignore_conflicts=True)
+                objects = []
+        model.objects.bulk_create(objects, ignore_conflicts=True)
@@ -0,0 +1,84 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import ShoppingCartItem
+from recipes.shopping_cart import aggregate_shopping_cart_totals
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Verify or rebuild materialized shopping cart totals'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Rebuild the table from the live aggregation.',
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='users',
+            help='Limit the command to the given user id.',
+        )
+
+    def handle(self, *args, **options):
+        """Сравнивает таблицу ShoppingCartItem с суммами,
+        посчитанными по рецептам из списков покупок,
+        и при необходимости пересобирает её.
+        """
+        users = options['users']
+        if options['rebuild']:
+            self.rebuild(users)
+            return
+        expected = aggregate_shopping_cart_totals(users)
+        items = ShoppingCartItem.objects.all()
+        if users is not None:
+            items = items.filter(user__in=users)
+        stored = {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total in items.values_list(
+                'user_id', 'ingredient_id', 'total'
+            )
+        }
+        mismatches = [
+            key for key in expected.keys() | stored.keys()
+            if expected.get(key) != stored.get(key)
+        ]
+        for user_id, ingredient_id in mismatches[:20]:
+            self.stdout.write(
+                f'user={user_id} ingredient={ingredient_id}: '
+                f'stored={stored.get((user_id, ingredient_id))} '
+                f'expected={expected.get((user_id, ingredient_id))}'
+            )
+        if mismatches:
+            raise CommandError(
+                f'{len(mismatches)} shopping cart totals are out of date, '
+                f'run with --rebuild.'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(stored)} shopping cart totals are up to date.'
+        ))
+
+    @transaction.atomic
+    def rebuild(self, users):
+        """Пересобирает таблицу ShoppingCartItem."""
+        items = ShoppingCartItem.objects.all()
+        if users is not None:
+            items = items.filter(user__in=users)
+        items.delete()
+        totals = aggregate_shopping_cart_totals(users)
+        ShoppingCartItem.objects.bulk_create(
+            [
+                ShoppingCartItem(
+                    user_id=user_id, ingredient_id=ingredient_id, total=total
+                )
+                for (user_id, ingredient_id), total in totals.items()
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {len(totals)} shopping cart totals.'
+        ))
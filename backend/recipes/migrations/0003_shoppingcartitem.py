@@ -0,0 +1,59 @@
+# Generated by Django 4.2.4 on 2026-10-18 02:46
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+import django.db.models.deletion
+
+
+def fill_shopping_cart_items(apps, schema_editor):
+    Amount = apps.get_model('recipes', 'Amount')
+    ShoppingCartItem = apps.get_model('recipes', 'ShoppingCartItem')
+    totals = Amount.objects.filter(
+        recipe__purchases__isnull=False
+    ).values(
+        'recipe__purchases__user', 'ingredient'
+    ).annotate(total=Sum('amount')).order_by()
+    ShoppingCartItem.objects.bulk_create(
+        [
+            ShoppingCartItem(
+                user_id=item['recipe__purchases__user'],
+                ingredient_id=item['ingredient'],
+                total=item['total'],
+            )
+            for item in totals
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingredients', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingCartItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.IntegerField(default=0, verbose_name='Общее количество ингредиента')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_items', to='ingredients.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_items', to=settings.AUTH_USER_MODEL, verbose_name='Покупатель')),
+            ],
+            options={
+                'verbose_name': 'Позиция списка покупок',
+                'verbose_name_plural': 'Позиции списка покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcartitem',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shopping_cart_item'),
+        ),
+        migrations.RunPython(
+            fill_shopping_cart_items, migrations.RunPython.noop
+        ),
+    ]
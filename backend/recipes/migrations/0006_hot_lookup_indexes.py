@@ -0,0 +1,85 @@
+# Generated by Django 4.2.4 on 2026-10-18 03:00
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+import django.db.models.deletion
+
+AMOUNT_MAX = 32767
+
+
+def merge_duplicate_amounts(apps, schema_editor):
+    """Объединяет повторяющиеся ингредиенты рецепта в одну запись
+    с суммарным количеством перед созданием ограничения уникальности.
+    """
+    Amount = apps.get_model('recipes', 'Amount')
+    duplicates = Amount.objects.values('recipe', 'ingredient').annotate(
+        rows=Count('id'), keep_id=Min('id'), total=Sum('amount')
+    ).filter(rows__gt=1)
+    for duplicate in duplicates:
+        Amount.objects.filter(pk=duplicate['keep_id']).update(
+            amount=min(duplicate['total'], AMOUNT_MAX)
+        )
+        Amount.objects.filter(
+            recipe=duplicate['recipe'], ingredient=duplicate['ingredient']
+        ).exclude(pk=duplicate['keep_id']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0005_recipe_tags_tag_recipe_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['recipe', 'user'], name='favorite_recipe_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['recipe', 'user'], name='purchase_recipe_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date', '-id'], include=('name', 'image', 'cooking_time'), name='recipe_author_pub_date_idx'),
+        ),
+        migrations.RunPython(
+            merge_duplicate_amounts, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='amount',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredient'), name='unique_recipe_ingredient'),
+        ),
+        migrations.AlterField(
+            model_name='amount',
+            name='recipe',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='amount_ingredients', to='recipes.recipe'),
+        ),
+        migrations.AlterField(
+            model_name='favorite',
+            name='recipe',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='favorites', to='recipes.recipe', verbose_name='Рецепты'),
+        ),
+        migrations.AlterField(
+            model_name='favorite',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='favorites', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AlterField(
+            model_name='purchase',
+            name='recipe',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='purchases', to='recipes.recipe', verbose_name='Рецепты'),
+        ),
+        migrations.AlterField(
+            model_name='purchase',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='purchases', to=settings.AUTH_USER_MODEL, verbose_name='Покупатель'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='author',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='recipes', to=settings.AUTH_USER_MODEL, verbose_name='Автор рецепта'),
+        ),
+    ]
@@ -1,9 +1,12 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
 from django.db.models import UniqueConstraint
 from django.contrib.auth import get_user_model
 
 from ingredients.models import Ingredient
+from .storage import recipe_image_storage
 
 User = get_user_model()
 
@@ -34,12 +37,19 @@ class Tag(models.Model):
         return self.name
 
 
+COMPUTED_FIELDS = (
+    'favorites_count', 'in_carts_count', 'search_vector', 'renditions'
+)
+POPULAR_ORDERING = ('-favorites_count', '-in_carts_count', '-pub_date', '-id')
+
+
 class Recipe(models.Model):
     """Модель Рецепт."""
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='recipes',
+        db_index=False,
         verbose_name='Автор рецепта',
     )
     ingredients = models.ManyToManyField(
@@ -55,8 +65,14 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         upload_to='recipes/',
+        storage=recipe_image_storage,
         verbose_name='Изображение'
     )
+    renditions = models.JSONField(
+        default=dict,
+        editable=False,
+        verbose_name='Уменьшенные копии изображения'
+    )
     name = models.CharField(
         max_length=200,
         verbose_name='Название рецепта'
@@ -74,6 +90,21 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации',
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Добавлений в избранное',
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Добавлений в список покупок',
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор',
+    )
 
     class Meta:
         constraints = [
@@ -82,13 +113,47 @@ class Recipe(models.Model):
                 name='unique_author_recipe'
             ),
         ]
-        ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                include=['name', 'image', 'cooking_time'],
+                name='recipe_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=[
+                    '-favorites_count', '-in_carts_count', '-pub_date', '-id'
+                ],
+                name='recipe_popular_idx'
+            ),
+            GinIndex(
+                fields=['search_vector'],
+                name='recipe_search_vector_idx'
+            ),
+        ]
+        ordering = ['-pub_date', '-id']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        """Сохраняет рецепт, не перезаписывая счётчики избранного
+        и списков покупок, поисковый вектор и уменьшенные копии
+        изображения: они изменяются только запросами UPDATE.
+        """
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in COMPUTED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 
 class Amount(models.Model):
     """
@@ -99,7 +164,8 @@ class Amount(models.Model):
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
-        related_name='amount_ingredients'
+        related_name='amount_ingredients',
+        db_index=False
     )
     ingredient = models.ForeignKey(
         Ingredient,
@@ -112,6 +178,12 @@ class Amount(models.Model):
     )
 
     class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=['recipe', 'ingredient'],
+                name='unique_recipe_ingredient'
+            )
+        ]
         verbose_name = 'Количество ингредиента'
         verbose_name_plural = 'Количество ингредиентов'
 
@@ -128,12 +200,14 @@ class Purchase(models.Model):
         User,
         on_delete=models.CASCADE,
         related_name='purchases',
+        db_index=False,
         verbose_name='Покупатель'
     )
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
         related_name='purchases',
+        db_index=False,
         verbose_name='Рецепты',
     )
 
@@ -144,6 +218,12 @@ class Purchase(models.Model):
                 name='unique_purchase'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'],
+                name='purchase_recipe_user_idx'
+            ),
+        ]
         verbose_name = 'Покупка'
         verbose_name_plural = 'Покупки'
 
@@ -159,12 +239,14 @@ class Favorite(models.Model):
         User,
         on_delete=models.CASCADE,
         related_name='favorites',
+        db_index=False,
         verbose_name='Пользователь'
     )
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
         related_name='favorites',
+        db_index=False,
         verbose_name='Рецепты',
     )
 
@@ -175,6 +257,12 @@ class Favorite(models.Model):
                 name='unique_favorite_recipe'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'],
+                name='favorite_recipe_user_idx'
+            ),
+        ]
         verbose_name = 'Избранный рецепт'
         verbose_name_plural = 'Избранные рецепты'
 
@@ -182,3 +270,43 @@ class Favorite(models.Model):
         return (
             f'{self.user.username} - {self.recipe.name}'
         )
+
+
+class ShoppingCartItem(models.Model):
+    """
+    Модель Позиция списка покупок - суммарное количество ингредиента
+    во всех рецептах из списка покупок пользователя.
+    Обновляется при изменении списка покупок и ингредиентов рецептов.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_items',
+        verbose_name='Покупатель'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_items',
+        verbose_name='Ингредиент'
+    )
+    total = models.IntegerField(
+        default=0,
+        verbose_name='Общее количество ингредиента'
+    )
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_cart_item'
+            )
+        ]
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Позиции списка покупок'
+
+    def __str__(self):
+        return (
+            f'{self.user.username}: {self.ingredient.name} '
+            f'{self.total}{self.ingredient.measurement_unit}.'
+        )
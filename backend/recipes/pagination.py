@@ -1,5 +1,327 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+from base64 import b64decode, b64encode
+from binascii import Error as BinasciiError
+from hashlib import md5
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.translation import gettext as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from .models import POPULAR_ORDERING
+
+CURSOR_SEPARATOR = '|'
+
+
+def estimate_count(queryset):
+    """Возвращает оценку количества строк запроса по плану PostgreSQL
+    или None, если оценку получить нельзя.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class ApproximatePage(Page):
+    """Страница, наличие следующей страницы для которой определено
+    по выборке, а не по количеству объектов.
+    """
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+
+class CountPaginator(Paginator):
+    """
+    Paginator, который не выполняет точный COUNT для каждого запроса.
+    Количество объектов берётся из кэша по ключу count_cache_key,
+    а если оценка планировщика PostgreSQL не меньше estimate_threshold,
+    то из этой оценки. Флаг count_is_exact показывает, что количество
+    посчитано запросом COUNT при обработке текущего запроса.
+    """
+
+    def __init__(self, object_list, per_page, count_cache_key=None,
+                 count_cache_timeout=0, estimate_threshold=0, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_cache_key = count_cache_key
+        self.count_cache_timeout = count_cache_timeout
+        self.estimate_threshold = estimate_threshold
+        self.count_is_exact = True
+
+    def get_cached_count(self):
+        if not self.count_cache_key or not self.count_cache_timeout:
+            return None
+        return cache.get(self.count_cache_key)
+
+    def get_estimated_count(self):
+        if not self.estimate_threshold or not hasattr(
+                self.object_list, 'query'
+        ):
+            return None
+        estimate = estimate_count(self.object_list)
+        if estimate is None or estimate < self.estimate_threshold:
+            return None
+        return estimate
+
+    @cached_property
+    def count(self):
+        count = self.get_cached_count()
+        if count is None:
+            count = self.get_estimated_count()
+        if count is not None:
+            self.count_is_exact = False
+            return count
+        count = super().count
+        if self.count_cache_key and self.count_cache_timeout:
+            cache.set(self.count_cache_key, count, self.count_cache_timeout)
+        return count
+
+    def page(self, number):
+        """Для приблизительного количества объектов выбирает страницу
+        без проверки номера по количеству страниц, а наличие следующей
+        страницы определяет по лишнему объекту в выборке.
+        """
+        # Флаг count_is_exact устанавливается при вычислении count.
+        self.count
+        if self.count_is_exact:
+            return super().page(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(_('That page number is not an integer'))
+        if number < 1:
+            raise EmptyPage(_('That page number is less than 1'))
+        bottom = (number - 1) * self.per_page
+        object_list = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not object_list and number > 1:
+            raise EmptyPage(_('That page contains no results'))
+        return ApproximatePage(
+            object_list[:self.per_page], number, self,
+            has_next=len(object_list) > self.per_page
+        )
+
+
+class KeysetPagination(BasePagination):
+    """
+    Постраничный вывод по ключу сортировки (keyset pagination).
+    Курсор хранит значения полей ordering последнего объекта страницы,
+    а следующая страница выбирается условием по этим полям, поэтому
+    время ответа не зависит от глубины прокрутки и не требует COUNT.
+    """
+    ordering = ('-id',)
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    invalid_cursor_message = 'Некорректный курсор.'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_fields(self):
+        """Возвращает пары (поле, по убыванию ли сортировка)."""
+        return [
+            (field.lstrip('-'), field.startswith('-'))
+            for field in self.ordering
+        ]
+
+    def encode_cursor(self, obj):
+        values = [
+            str(getattr(obj, field.lstrip('-'))) for field in self.ordering
+        ]
+        return b64encode(
+            CURSOR_SEPARATOR.join(values).encode()
+        ).decode()
+
+    def decode_cursor(self, cursor, model):
+        try:
+            values = b64decode(cursor.encode()).decode().split(
+                CURSOR_SEPARATOR
+            )
+            if len(values) != len(self.ordering):
+                raise ValueError
+            return [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (BinasciiError, UnicodeDecodeError, ValueError,
+                ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_position_filter(self, fields, values):
+        """Условие "после курсора" для составного ключа:
+        (a, b) < (x, y) записывается как a <= x AND (a < x OR b < y),
+        чтобы индекс по (a, b) ограничивал сканирование.
+        """
+        (field, descending), *other_fields = fields
+        value, *other_values = values
+        lookup = 'lt' if descending else 'gt'
+        after = Q(**{f'{field}__{lookup}': value})
+        if not other_fields:
+            return after
+        return Q(**{f'{field}__{lookup}e': value}) & (
+            after | self.get_position_filter(other_fields, other_values)
+        )
+
+    def get_ordering(self, request):
+        """Возвращает поля сортировки, составляющие ключ курсора."""
+        return self.ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = self.get_ordering(request)
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self.get_position_filter(
+                self.get_fields(), self.decode_cursor(cursor, queryset.model)
+            ))
+        results = list(queryset[:page_size + 1])
+        self.next_cursor = None
+        if len(results) > page_size:
+            results = results[:page_size]
+            self.next_cursor = self.encode_cursor(results[-1])
+        return results
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.next_cursor
+        )
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+
+class RecipeKeysetPagination(KeysetPagination):
+    ordering = ('-pub_date', '-id')
+
+    def get_ordering(self, request):
+        if request.query_params.get('ordering') == 'popular':
+            return POPULAR_ORDERING
+        return self.ordering
+
+
+class SubscriptionKeysetPagination(KeysetPagination):
+    ordering = ('id',)
 
 
 class CustomPagination(PageNumberPagination):
+    """
+    Постраничный вывод по номеру страницы. Если задан класс
+    keyset_pagination_class, по параметру pagination=cursor
+    или при наличии параметра cursor используется вывод по ключу.
+
+    Количество объектов кэшируется на PAGINATION_COUNT_CACHE_TIMEOUT
+    секунд, а при оценке планировщика от
+    PAGINATION_COUNT_ESTIMATE_THRESHOLD строк заменяется этой оценкой.
+    """
     page_size_query_param = 'limit'
+    keyset_pagination_class = None
+    count_cache_ignored_params = ('page', 'limit', 'format')
+
+    def get_count_cache_key(self, request):
+        """Формирует ключ кэша количества объектов по пути, пользователю
+        и отсортированным параметрам фильтрации.
+        """
+        params = sorted(
+            (key, value)
+            for key, values in request.query_params.lists()
+            if key not in self.count_cache_ignored_params
+            for value in values
+        )
+        raw_key = (
+            f'{request.path}|{request.user.pk}|{urlencode(params)}'
+        )
+        return f'pagination:count:{md5(raw_key.encode()).hexdigest()}'
+
+    def django_paginator_class(self, queryset, page_size):
+        return CountPaginator(
+            queryset,
+            page_size,
+            count_cache_key=self.get_count_cache_key(self.request),
+            count_cache_timeout=settings.PAGINATION_COUNT_CACHE_TIMEOUT,
+            estimate_threshold=settings.PAGINATION_COUNT_ESTIMATE_THRESHOLD,
+        )
+
+    def use_keyset(self, request):
+        return self.keyset_pagination_class is not None and (
+            request.query_params.get('pagination') == 'cursor'
+            or 'cursor' in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.keyset_paginator = None
+        if self.use_keyset(request):
+            self.keyset_paginator = self.keyset_pagination_class()
+            return self.keyset_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset_paginator is not None:
+            return self.keyset_paginator.get_paginated_response(data)
+        return Response({
+            'count': self.page.paginator.count,
+            'count_is_exact': self.page.paginator.count_is_exact,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class RecipePagination(CustomPagination):
+    """Результаты поиска отсортированы по релевантности,
+    поэтому для них всегда используется вывод по номеру страницы.
+    """
+    keyset_pagination_class = RecipeKeysetPagination
+
+    def use_keyset(self, request):
+        return (
+            not request.query_params.get('search')
+            and super().use_keyset(request)
+        )
+
+
+class SubscriptionPagination(CustomPagination):
+    keyset_pagination_class = SubscriptionKeysetPagination
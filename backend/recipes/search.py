@@ -0,0 +1,47 @@
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db.models import F, OuterRef, Subquery
+
+from .models import Amount, Recipe
+
+SEARCH_CONFIG = 'russian'
+
+
+def get_search_vector():
+    """Возвращает выражение поискового вектора рецепта: название
+    с наибольшим весом, затем названия ингредиентов и описание.
+    Названия ингредиентов лежат в другой таблице, поэтому вектор
+    хранится в обычном столбце и обновляется приложением.
+    """
+    ingredient_names = Subquery(
+        Amount.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe').annotate(
+            names=StringAgg('ingredient__name', ' ')
+        ).values('names')
+    )
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(ingredient_names, weight='B', config=SEARCH_CONFIG)
+        + SearchVector('text', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vector(recipes):
+    """Пересчитывает поисковый вектор рецептов одним запросом UPDATE.
+    Принимает рецепт или QuerySet рецептов.
+    """
+    if isinstance(recipes, Recipe):
+        recipes = Recipe.objects.filter(pk=recipes.pk)
+    return recipes.update(search_vector=get_search_vector())
+
+
+def search_recipes(queryset, value):
+    """Оставляет рецепты, соответствующие поисковому запросу,
+    и сортирует их по релевантности.
+    """
+    query = SearchQuery(value, config=SEARCH_CONFIG, search_type='websearch')
+    return queryset.filter(search_vector=query).annotate(
+        rank=SearchRank(F('search_vector'), query)
+    ).order_by('-rank', '-pub_date', '-id')
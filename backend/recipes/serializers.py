@@ -1,11 +1,35 @@
-from django.shortcuts import get_object_or_404
+import json
+
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.fields import SerializerMethodField
 
 from ingredients.models import Ingredient
 from users.serializers import UserSerializer
+from .catalogs import tag_catalog
+from .images import RecipeImageField, get_image_renditions, schedule_renditions
 from .models import Amount, Favorite, Purchase, Recipe, Tag
+from .search import update_search_vector
+from .shopping_cart import update_recipe_in_shopping_carts
+
+
+def get_ingredients_prefetch():
+    """Возвращает предзагрузку ингредиентов рецепта
+    вместе с их единицами измерения.
+    """
+    return Prefetch(
+        'amount_ingredients',
+        queryset=Amount.objects.select_related('ingredient__measurement_unit')
+    )
+
+
+def get_tags_prefetch():
+    """Возвращает предзагрузку идентификаторов тегов рецепта,
+    сами теги берутся из кэша справочника.
+    """
+    return Prefetch('tags', queryset=Tag.objects.only('id'))
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -30,7 +54,7 @@ class AmountSerializer(serializers.ModelSerializer):
 
 class RecipeReadSerializer(serializers.ModelSerializer):
     """Сериализатор для чтения информации о рецептах."""
-    tags = TagSerializer(many=True, read_only=True)
+    tags = SerializerMethodField()
     author = UserSerializer(read_only=True)
     ingredients = AmountSerializer(
         many=True, read_only=True, source='amount_ingredients'
@@ -38,6 +62,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     is_favorited = SerializerMethodField()
     is_in_shopping_cart = SerializerMethodField()
     image = Base64ImageField()
+    image_renditions = SerializerMethodField()
 
     class Meta:
         model = Recipe
@@ -50,19 +75,40 @@ class RecipeReadSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_renditions',
             'text',
             'cooking_time',
         )
 
+    def get_tags(self, obj):
+        """Получение тегов рецепта из кэша справочника тегов."""
+        tags = tag_catalog.get_by_id()
+        return [
+            tags.get(tag.id) or TagSerializer(tag).data
+            for tag in obj.tags.all()
+        ]
+
+    def get_image_renditions(self, obj):
+        """Получение URL уменьшенных копий изображения."""
+        return get_image_renditions(obj)
+
     def get_is_favorited(self, obj):
-        """Получение значения поля is_favorited."""
+        """Получение значения поля is_favorited.
+        Использует аннотацию из RecipeViewSet.get_queryset, если она есть.
+        """
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context['request'].user
         if user.is_anonymous:
             return False
         return Favorite.objects.filter(user=user, recipe=obj).exists()
 
     def get_is_in_shopping_cart(self, obj):
-        """Получение значения поля is_in_shopping_cart."""
+        """Получение значения поля is_in_shopping_cart.
+        Использует аннотацию из RecipeViewSet.get_queryset, если она есть.
+        """
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context['request'].user
         if user.is_anonymous:
             return False
@@ -93,7 +139,7 @@ class AmountCreateSerializer(serializers.ModelSerializer):
 class RecipeChangeSerializer(serializers.ModelSerializer):
     """Сериализатор для создания и обновления рецептов."""
     ingredients = AmountCreateSerializer(many=True)
-    image = Base64ImageField(max_length=False, use_url=True)
+    image = RecipeImageField(max_length=False, use_url=True)
 
     class Meta:
         model = Recipe
@@ -106,6 +152,28 @@ class RecipeChangeSerializer(serializers.ModelSerializer):
             'cooking_time'
         )
 
+    def to_internal_value(self, data):
+        """Принимает рецепт и в виде multipart/form-data: теги
+        передаются повторяющимся полем tags, ингредиенты - строкой JSON
+        в поле ingredients, изображение - файлом в поле image.
+        """
+        if hasattr(data, 'getlist'):
+            form_data = data
+            data = {
+                key: form_data[key] for key in form_data
+                if key not in ('tags', 'ingredients')
+            }
+            if 'tags' in form_data:
+                data['tags'] = form_data.getlist('tags')
+            if 'ingredients' in form_data:
+                try:
+                    data['ingredients'] = json.loads(form_data['ingredients'])
+                except ValueError:
+                    raise serializers.ValidationError({
+                        'ingredients': ['Ожидается список в формате JSON.']
+                    })
+        return super().to_internal_value(data)
+
     def validate(self, attrs):
         """Метод, который валидирует данные перед созданием или обновлением рецепта."""
         if self.context['request'].method == 'POST' and Recipe.objects.filter(
@@ -138,19 +206,61 @@ class RecipeChangeSerializer(serializers.ModelSerializer):
                     'не должно быть меньше или равно нулю!'
                 )
             ingredients_list.append(ingredient['id'])
+        found = Ingredient.objects.only('id').in_bulk(ingredients_list)
+        missing = [
+            ingredient_id for ingredient_id in ingredients_list
+            if ingredient_id not in found
+        ]
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиенты не найдены: {", ".join(map(str, missing))}.'
+            )
         return attrs
 
-    def add_ingredient_to_recipe(self, recipe, ingredients):
-        """Метод добавления ингредиента в рецепт."""
-        for ingredient in ingredients:
-            ingredient_object = get_object_or_404(
-                Ingredient, id=ingredient['id']
-            )
-            recipe.ingredients.add(
-                ingredient_object,
-                through_defaults={'amount': ingredient['amount']}
-            )
+    def set_recipe_ingredients(self, recipe, ingredients):
+        """Метод приводит ингредиенты рецепта к переданному списку:
+        добавляет новые, удаляет отсутствующие и обновляет
+        изменившиеся количества. Удалённые строки вычитаются из списков
+        покупок сигналом post_delete, а массовые обновление и вставка
+        сигналов не отправляют, поэтому их изменения переносятся
+        в списки покупок здесь.
+        """
+        new_amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        current = {}
+        to_delete = []
+        for amount in recipe.amount_ingredients.all():
+            if (amount.ingredient_id in new_amounts
+                    and amount.ingredient_id not in current):
+                current[amount.ingredient_id] = amount
+            else:
+                to_delete.append(amount.id)
+        changes = {}
+        to_update = []
+        for ingredient_id, amount in current.items():
+            if amount.amount != new_amounts[ingredient_id]:
+                changes[ingredient_id] = (
+                    new_amounts[ingredient_id] - amount.amount
+                )
+                amount.amount = new_amounts[ingredient_id]
+                to_update.append(amount)
+        if to_delete:
+            Amount.objects.filter(id__in=to_delete).delete()
+        if to_update:
+            Amount.objects.bulk_update(to_update, ['amount'])
+        to_create = [
+            Amount(recipe=recipe, ingredient_id=ingredient_id, amount=amount)
+            for ingredient_id, amount in new_amounts.items()
+            if ingredient_id not in current
+        ]
+        Amount.objects.bulk_create(to_create)
+        for amount in to_create:
+            changes[amount.ingredient_id] = amount.amount
+        update_recipe_in_shopping_carts(recipe, changes)
 
+    @transaction.atomic
     def create(self, validated_data):
         """Метод создания рецепта на основе
         предоставленных валидированных данных.
@@ -160,34 +270,63 @@ class RecipeChangeSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(
             **validated_data, author=self.context['request'].user
         )
-        recipe.tags.add(*tags)
-        self.add_ingredient_to_recipe(recipe, ingredients)
-        recipe.save()
+        recipe.tags.set(tags)
+        Amount.objects.bulk_create(
+            Amount(
+                recipe=recipe,
+                ingredient_id=ingredient['id'],
+                amount=ingredient['amount']
+            )
+            for ingredient in ingredients
+        )
+        update_search_vector(recipe)
+        schedule_renditions(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, obj, validated_data):
         """Метод обновления рецепта на основе
         предоставленных валидированных данных."""
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        obj.tags.clear()
-        obj.ingredients.clear()
-        obj.tags.add(*tags)
-        self.add_ingredient_to_recipe(obj, ingredients)
-        return super().update(obj, validated_data)
+        obj.tags.set(tags)
+        self.set_recipe_ingredients(obj, ingredients)
+        recipe = super().update(obj, validated_data)
+        update_search_vector(recipe)
+        schedule_renditions(recipe)
+        return recipe
+
+    def save(self, **kwargs):
+        """Закрывает временный файл изображения после сохранения."""
+        try:
+            return super().save(**kwargs)
+        finally:
+            image = self.validated_data.get('image')
+            if image is not None:
+                image.close()
 
     def to_representation(self, obj):
         """Метод преобразует объект рецепта в представление
         RecipeReadSerializer, включающее теги и ингредиенты и др. в ответ.
         """
+        obj._prefetched_objects_cache = {}
+        prefetch_related_objects(
+            [obj], get_tags_prefetch(), get_ingredients_prefetch()
+        )
         return RecipeReadSerializer(obj, context=self.context).data
 
 
 class RecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для краткого представления рецепта."""
+    image_renditions = SerializerMethodField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_renditions', 'cooking_time')
+
+    def get_image_renditions(self, obj):
+        """Получение URL уменьшенных копий изображения."""
+        return get_image_renditions(obj)
 
 
 class PurchaseSerializer(serializers.ModelSerializer):
@@ -0,0 +1,227 @@
+import csv
+from io import BytesIO
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFError, TTFont
+from reportlab.pdfgen import canvas
+from rest_framework import renderers
+
+from .models import Amount, Purchase, ShoppingCartItem
+
+PDF_FONT_NAME = 'ShoppingCartFont'
+PDF_CHUNK_SIZE = 64 * 1024
+
+
+def get_shopping_cart_ingredients(user):
+    """Возвращает позиции списка покупок пользователя,
+    заранее просуммированные в таблице ShoppingCartItem.
+    """
+    return ShoppingCartItem.objects.filter(
+        user=user
+    ).values(
+        'total',
+        name=F('ingredient__name'),
+        measurement_unit=F('ingredient__measurement_unit__name'),
+    ).order_by('name')
+
+
+def aggregate_shopping_cart_totals(users=None):
+    """Суммирует ингредиенты рецептов из списков покупок одним запросом.
+    Возвращает словарь {(id пользователя, id ингредиента): количество}.
+    Используется для пересборки и проверки таблицы ShoppingCartItem.
+    """
+    # Условия на покупки задаются одним вызовом filter(): в отдельных
+    # вызовах Django присоединяет таблицу покупок повторно.
+    lookups = {'recipe__purchases__isnull': False}
+    if users is not None:
+        lookups['recipe__purchases__user__in'] = users
+    totals = Amount.objects.filter(**lookups).values(
+        'recipe__purchases__user', 'ingredient'
+    ).annotate(total=Sum('amount')).order_by()
+    return {
+        (item['recipe__purchases__user'], item['ingredient']): item['total']
+        for item in totals
+    }
+
+
+def get_recipe_amounts(recipe):
+    """Возвращает словарь {id ингредиента: количество} для рецепта."""
+    amounts = {}
+    for ingredient_id, amount in Amount.objects.filter(
+            recipe=recipe
+    ).values_list('ingredient_id', 'amount'):
+        amounts[ingredient_id] = amounts.get(ingredient_id, 0) + amount
+    return amounts
+
+
+def update_shopping_cart_totals(user_ids, changes):
+    """Изменяет суммарные количества ингредиентов в списках покупок
+    пользователей на величины из словаря {id ингредиента: изменение}.
+    """
+    changes = {
+        ingredient_id: delta
+        for ingredient_id, delta in changes.items() if delta
+    }
+    user_ids = list(user_ids)
+    if not user_ids or not changes:
+        return
+    with transaction.atomic():
+        ShoppingCartItem.objects.bulk_create(
+            [
+                ShoppingCartItem(user_id=user_id, ingredient_id=ingredient_id)
+                for user_id in user_ids
+                for ingredient_id, delta in changes.items() if delta > 0
+            ],
+            ignore_conflicts=True,
+        )
+        items = ShoppingCartItem.objects.filter(
+            user_id__in=user_ids, ingredient_id__in=changes
+        )
+        items.update(
+            total=F('total') + Case(
+                *[
+                    When(ingredient_id=ingredient_id, then=Value(delta))
+                    for ingredient_id, delta in changes.items()
+                ],
+                output_field=IntegerField(),
+            )
+        )
+        items.filter(total__lte=0).delete()
+
+
+def update_recipe_in_shopping_carts(recipe, changes):
+    """Переносит изменения ингредиентов рецепта, словарь
+    {id ингредиента: изменение}, в списки покупок всех пользователей,
+    добавивших рецепт в покупки.
+    """
+    update_shopping_cart_totals(
+        Purchase.objects.filter(recipe=recipe).values_list(
+            'user_id', flat=True
+        ),
+        changes
+    )
+
+
+async def stream_async(chunks):
+    """Отдаёт готовые части файла асинхронно, чтобы под ASGI ответ
+    медленному клиенту отправлялся в цикле событий, не занимая поток.
+    Части должны быть построены заранее: итерация выполняется в цикле
+    событий и не должна обращаться к базе данных или долго вычислять.
+    """
+    for chunk in chunks:
+        yield chunk
+
+
+class Echo:
+    """Объект с интерфейсом файла, который возвращает записанную строку.
+    Позволяет использовать csv.writer для построчной генерации ответа.
+    """
+
+    def write(self, value):
+        return value
+
+
+class ShoppingCartRenderer(renderers.BaseRenderer):
+    """Базовый класс форматов списка покупок.
+    Наследники определяют метод stream, возвращающий генератор частей
+    файла, что позволяет отдавать список через StreamingHttpResponse.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Отрисовывает ответы с ошибками, например 401."""
+        if isinstance(data, dict):
+            data = '\n'.join(f'{key}: {value}' for key, value in data.items())
+        return str(data).encode(self.charset or 'utf-8')
+
+
+class TextShoppingCartRenderer(ShoppingCartRenderer):
+    """Список покупок в виде текстового файла."""
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, ingredients):
+        for item in ingredients:
+            yield (
+                f'{item["name"]} - {item["total"]} '
+                f'{item["measurement_unit"]}\n'
+            )
+
+
+class CSVShoppingCartRenderer(ShoppingCartRenderer):
+    """Список покупок в виде CSV-файла."""
+    media_type = 'text/csv'
+    format = 'csv'
+    header = ('Ингредиент', 'Количество', 'Единица измерения')
+
+    def stream(self, ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(self.header)
+        for item in ingredients:
+            yield writer.writerow(
+                (item['name'], item['total'], item['measurement_unit'])
+            )
+
+
+class PDFShoppingCartRenderer(ShoppingCartRenderer):
+    """Список покупок в виде PDF-файла.
+    Формат PDF требует таблицы смещений в конце файла, поэтому документ
+    собирается в буфере и отдаётся частями после построения.
+    """
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    title = 'Список покупок'
+    font_size = 12
+    line_height = 18
+    margin = 50
+
+    def get_font_name(self):
+        """Регистрирует шрифт с поддержкой кириллицы, если он доступен."""
+        if PDF_FONT_NAME in pdfmetrics.getRegisteredFontNames():
+            return PDF_FONT_NAME
+        try:
+            pdfmetrics.registerFont(
+                TTFont(PDF_FONT_NAME, settings.SHOPPING_CART_PDF_FONT)
+            )
+        except TTFError:
+            return 'Helvetica'
+        return PDF_FONT_NAME
+
+    def stream(self, ingredients):
+        buffer = BytesIO()
+        font_name = self.get_font_name()
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        pdf.setTitle(self.title)
+        _, height = A4
+        pdf.setFont(font_name, self.font_size + 4)
+        y = height - self.margin
+        pdf.drawString(self.margin, y, self.title)
+        y -= self.line_height * 2
+        pdf.setFont(font_name, self.font_size)
+        for item in ingredients:
+            if y < self.margin:
+                pdf.showPage()
+                pdf.setFont(font_name, self.font_size)
+                y = height - self.margin
+            pdf.drawString(
+                self.margin, y,
+                f'{item["name"]} - {item["total"]} '
+                f'{item["measurement_unit"]}'
+            )
+            y -= self.line_height
+        pdf.save()
+        buffer.seek(0)
+        while chunk := buffer.read(PDF_CHUNK_SIZE):
+            yield chunk
+
+
+SHOPPING_CART_RENDERERS = (
+    TextShoppingCartRenderer,
+    CSVShoppingCartRenderer,
+    PDFShoppingCartRenderer,
+)
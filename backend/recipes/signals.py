@@ -0,0 +1,143 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from backend.cache import invalidate_versions
+from ingredients.models import Ingredient, Unit
+from .catalogs import tag_catalog
+from .counters import change_recipe_counter
+from .models import Amount, Favorite, Purchase, Recipe, Tag
+from .search import update_search_vector
+from .shopping_cart import (get_recipe_amounts,
+                            update_recipe_in_shopping_carts,
+                            update_shopping_cart_totals)
+
+User = get_user_model()
+
+AUTHOR_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags(**kwargs):
+    """Сбрасывает кэш тегов."""
+    tag_catalog.invalidate()
+    invalidate_versions('recipes')
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=Purchase)
+def increment_recipe_counter(sender, instance, created, **kwargs):
+    """Увеличивает счётчик рецепта при добавлении в избранное
+    или в список покупок.
+    """
+    if created:
+        change_recipe_counter(sender, instance.recipe_id, 1)
+        invalidate_versions('recipes:popular')
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=Purchase)
+def decrement_recipe_counter(sender, instance, **kwargs):
+    """Уменьшает счётчик рецепта при удалении из избранного
+    или из списка покупок, в том числе каскадном.
+    """
+    change_recipe_counter(sender, instance.recipe_id, -1)
+    invalidate_versions('recipes:popular')
+
+
+@receiver(post_save, sender=Purchase)
+def add_recipe_to_shopping_cart_totals(sender, instance, created, **kwargs):
+    """Добавляет ингредиенты рецепта в суммы списка покупок."""
+    if created:
+        update_shopping_cart_totals(
+            [instance.user_id], get_recipe_amounts(instance.recipe_id)
+        )
+
+
+@receiver(post_delete, sender=Purchase)
+def remove_recipe_from_shopping_cart_totals(sender, instance, **kwargs):
+    """Вычитает ингредиенты рецепта из сумм списка покупок, в том числе
+    при каскадном удалении рецепта или пользователя. Если ингредиенты
+    рецепта удалены раньше покупки, их уже вычел receiver удаления Amount.
+    """
+    update_shopping_cart_totals(
+        [instance.user_id],
+        {
+            ingredient_id: -amount
+            for ingredient_id, amount
+            in get_recipe_amounts(instance.recipe_id).items()
+        }
+    )
+
+
+@receiver(pre_save, sender=Amount)
+def remember_saved_amount(sender, instance, **kwargs):
+    """Запоминает ингредиент и количество до изменения строки."""
+    instance.saved_amount = None
+    if instance.pk is not None:
+        instance.saved_amount = Amount.objects.filter(
+            pk=instance.pk
+        ).values_list('ingredient_id', 'amount').first()
+
+
+@receiver(post_save, sender=Amount)
+def update_amount_in_shopping_carts(sender, instance, **kwargs):
+    """Переносит добавление или изменение ингредиента рецепта,
+    например в админке, в списки покупок.
+    """
+    changes = {instance.ingredient_id: instance.amount}
+    if instance.saved_amount is not None:
+        ingredient_id, amount = instance.saved_amount
+        changes[ingredient_id] = changes.get(ingredient_id, 0) - amount
+    update_recipe_in_shopping_carts(instance.recipe_id, changes)
+
+
+@receiver(post_delete, sender=Amount)
+def remove_amount_from_shopping_carts(sender, instance, **kwargs):
+    """Вычитает удалённый ингредиент рецепта из списков покупок,
+    в том числе при каскадном удалении рецепта или ингредиента.
+    """
+    update_recipe_in_shopping_carts(
+        instance.recipe_id, {instance.ingredient_id: -instance.amount}
+    )
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_recipes_search(sender, instance, created, **kwargs):
+    """Обновляет поисковые векторы рецептов при изменении ингредиента."""
+    if not created:
+        update_search_vector(
+            Recipe.objects.filter(amount_ingredients__ingredient=instance)
+        )
+
+
+@receiver((post_save, post_delete), sender=Unit)
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_recipes(**kwargs):
+    """Сбрасывает кэш ответов со всеми рецептами."""
+    invalidate_versions('recipes')
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe(sender, instance, **kwargs):
+    """Сбрасывает кэш ответов с рецептом и списков рецептов."""
+    invalidate_versions('recipes:list', f'recipes:{instance.pk}')
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes(sender, instance, created, update_fields,
+                              **kwargs):
+    """Сбрасывает кэш ответов с рецептами пользователя при изменении
+    его данных, которые выводятся в рецептах.
+    """
+    if created or (
+            update_fields is not None
+            and not AUTHOR_FIELDS & set(update_fields)
+    ):
+        return
+    recipe_ids = Recipe.objects.filter(author=instance).values_list(
+        'id', flat=True
+    )
+    invalidate_versions(
+        'recipes:list', *(f'recipes:{pk}' for pk in recipe_ids)
+    )
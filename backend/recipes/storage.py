@@ -0,0 +1,53 @@
+import hashlib
+import os
+import posixpath
+from pathlib import PurePosixPath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Файловое хранилище, в котором имя файла - хэш SHA-256 его
+    содержимого. Файл с уже сохранённым содержимым повторно
+    не записывается, а рецепты с одинаковыми изображениями ссылаются
+    на один файл. Поэтому файлы не удаляются вместе с рецептами,
+    а неиспользуемые удаляет команда recipe_images_gc. При повторной
+    загрузке обновляется время изменения существующего файла.
+    """
+
+    def get_content_name(self, name, content):
+        """Возвращает имя файла по хэшу содержимого, сохраняя
+        каталог и расширение исходного имени.
+        """
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        return posixpath.join(
+            posixpath.dirname(name),
+            digest.hexdigest() + PurePosixPath(name).suffix.lower()
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_content_name(name, content)
+        if self.exists(name):
+            # Время изменения обновляется, чтобы recipe_images_gc
+            # не удалил файл, который снова стал использоваться.
+            try:
+                os.utime(self.path(name))
+                return name
+            except FileNotFoundError:
+                pass
+        return super().save(name, content, max_length)
+
+
+recipe_image_storage = ContentAddressedStorage()
@@ -1,3 +1,1509 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import (async_to_sync, iscoroutinefunction,
+                           sync_to_async)
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, connections
+from django.test import (AsyncClient, AsyncRequestFactory, RequestFactory,
+                         TestCase, TransactionTestCase, modify_settings,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import path
+from PIL import Image
+from prometheus_client import REGISTRY
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, force_authenticate
+
+from backend.async_views import get_executor, keep_connections
+from backend.cache import VERSION_TIMEOUT
+from backend import urls
+from backend.metrics import (RequestMetricsMiddleware, install_query_wrapper,
+                             metrics_view)
+
+from ingredients.models import Ingredient, Unit
+from .catalogs import tag_catalog
+from .images import RecipeImageField
+from .models import Amount, Favorite, Purchase, Recipe, ShoppingCartItem, Tag
+from .search import search_recipes, update_search_vector
+from .shopping_cart import PDFShoppingCartRenderer
+from .views import TagViewSet
+
+User = get_user_model()
+
+# Адрес /metrics добавляется в backend.urls при импорте, только если
+# включена настройка REQUEST_METRICS, поэтому тесты показателей
+# используют собственный набор адресов.
+urlpatterns = [
+    *urls.urlpatterns,
+    path('metrics', metrics_view, name='metrics'),
+]
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_image_payload(size=(2, 2)):
+    """Возвращает изображение в формате base64 для Base64ImageField."""
+    buffer = BytesIO()
+    Image.new('RGB', size, 'white').save(buffer, format='PNG')
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+class RecipeAPITestCase(TestCase):
+    """Общие данные для тестов API рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email='user@example.org',
+            username='user',
+            first_name='Имя',
+            last_name='Фамилия',
+            password='password',
+        )
+        cls.author = User.objects.create_user(
+            email='author@example.org',
+            username='author',
+            first_name='Автор',
+            last_name='Рецептов',
+            password='password',
+        )
+        unit = Unit.objects.create(name='г')
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'ингредиент {i}', measurement_unit=unit
+            )
+            for i in range(3)
+        ]
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тег {i}', color=f'#00000{i}', slug=f'tag{i}'
+            )
+            for i in range(2)
+        ]
+        cls.recipes = []
+        for i in range(5):
+            recipe = Recipe.objects.create(
+                author=cls.author,
+                name=f'Рецепт {i}',
+                text='Описание',
+                cooking_time=10,
+                image='recipes/test.png',
+            )
+            recipe.tags.set(cls.tags)
+            for ingredient in cls.ingredients:
+                Amount.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=100
+                )
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        cache.clear()
+        tag_catalog.get()
+        self.guest_client = APIClient()
+        self.authorized_client = APIClient()
+        self.authorized_client.force_authenticate(self.user)
+
+    def count_queries(self, client, url):
+        """Возвращает ответ и количество выполненных SQL-запросов."""
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        return response, len(context.captured_queries)
+
+
+class RecipeFlagsTests(RecipeAPITestCase):
+    """Тесты полей is_favorited и is_in_shopping_cart."""
+
+    def test_flags_for_authorized_user(self):
+        """Флаги отражают избранное и список покупок пользователя."""
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+        Purchase.objects.create(user=self.user, recipe=self.recipes[1])
+        response = self.authorized_client.get('/api/recipes/?limit=10')
+        results = {
+            item['id']: item for item in response.json()['results']
+        }
+        self.assertTrue(results[self.recipes[0].id]['is_favorited'])
+        self.assertFalse(results[self.recipes[0].id]['is_in_shopping_cart'])
+        self.assertTrue(results[self.recipes[1].id]['is_in_shopping_cart'])
+        self.assertFalse(results[self.recipes[2].id]['is_favorited'])
+
+    def test_flags_for_anonymous_user(self):
+        """Для анонимного пользователя флаги всегда ложны."""
+        response = self.guest_client.get('/api/recipes/')
+        for item in response.json()['results']:
+            self.assertFalse(item['is_favorited'])
+            self.assertFalse(item['is_in_shopping_cart'])
+
+    def test_flags_do_not_depend_on_page_size(self):
+        """Флаги вычисляются одним запросом для всей страницы."""
+        def flag_queries(limit):
+            with CaptureQueriesContext(connection) as context:
+                self.authorized_client.get(f'/api/recipes/?limit={limit}')
+            return [
+                query['sql'] for query in context.captured_queries
+                if 'FROM "recipes_recipe"' not in query['sql']
+                and ('"recipes_favorite"' in query['sql']
+                     or '"recipes_purchase"' in query['sql'])
+            ]
+
+        self.assertEqual(flag_queries(1), [])
+        self.assertEqual(flag_queries(5), [])
+
+
+class RecipeQueryCountTests(RecipeAPITestCase):
+    """Тесты количества SQL-запросов при чтении рецептов."""
+
+    # COUNT, страница рецептов, id тегов, ингредиенты.
+    MAX_LIST_QUERIES = 4
+    # Рецепт, id тегов, ингредиенты.
+    MAX_DETAIL_QUERIES = 3
+
+    def test_list_queries_are_bounded(self):
+        """Количество запросов к списку не зависит от размера страницы."""
+        for limit in (1, 5):
+            with self.subTest(limit=limit):
+                response, queries = self.count_queries(
+                    self.guest_client, f'/api/recipes/?limit={limit}'
+                )
+                self.assertEqual(len(response.json()['results']), limit)
+                self.assertLessEqual(queries, self.MAX_LIST_QUERIES)
+
+    def test_detail_queries_are_bounded(self):
+        """Детальный просмотр рецепта выполняет фиксированное число запросов."""
+        response, queries = self.count_queries(
+            self.guest_client, f'/api/recipes/{self.recipes[0].id}/'
+        )
+        self.assertEqual(len(response.json()['ingredients']), 3)
+        self.assertEqual(len(response.json()['tags']), 2)
+        self.assertLessEqual(queries, self.MAX_DETAIL_QUERIES)
+
+    def test_authorized_list_queries_are_bounded(self):
+        """Подписки на авторов рецептов загружаются одним запросом."""
+        response, queries = self.count_queries(
+            self.authorized_client, '/api/recipes/?limit=5'
+        )
+        self.assertEqual(len(response.json()['results']), 5)
+        self.assertLessEqual(queries, self.MAX_LIST_QUERIES + 1)
+
+
+class RecipeCursorPaginationTests(RecipeAPITestCase):
+    """Тесты постраничного вывода рецептов по курсору."""
+
+    def walk(self, url):
+        """Проходит все страницы по ссылкам next и возвращает id рецептов
+        и количество запросов на каждой странице.
+        """
+        ids, queries = [], []
+        while url:
+            response, count = self.count_queries(self.guest_client, url)
+            self.assertEqual(response.status_code, 200)
+            ids += [item['id'] for item in response.json()['results']]
+            queries.append(count)
+            url = response.json()['next']
+        return ids, queries
+
+    def test_cursor_walks_whole_feed(self):
+        """Курсор выдаёт рецепты в том же порядке, что и номера страниц."""
+        expected = [
+            item['id'] for item in self.guest_client.get(
+                '/api/recipes/?limit=10'
+            ).json()['results']
+        ]
+        ids, queries = self.walk('/api/recipes/?pagination=cursor&limit=2')
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(queries), 3)
+        # Страница рецептов, id тегов, ингредиенты - без COUNT.
+        for count in queries:
+            self.assertLessEqual(count, 3)
+
+    def test_cursor_with_equal_pub_date(self):
+        """Рецепты с одинаковой датой публикации не теряются и не
+        повторяются на границе страниц.
+        """
+        Recipe.objects.update(pub_date=self.recipes[0].pub_date)
+        ids, _ = self.walk('/api/recipes/?pagination=cursor&limit=2')
+        self.assertEqual(
+            ids, sorted((recipe.id for recipe in self.recipes), reverse=True)
+        )
+
+    def test_cursor_respects_filters(self):
+        response = self.guest_client.get(
+            f'/api/recipes/?pagination=cursor&author={self.user.id}'
+        )
+        self.assertEqual(response.json(), {'next': None, 'results': []})
+
+    def test_invalid_cursor(self):
+        response = self.guest_client.get('/api/recipes/?cursor=invalid')
+        self.assertEqual(response.status_code, 404)
+
+
+class RecipeCountTests(RecipeAPITestCase):
+    """Тесты кэшированного и приблизительного количества рецептов."""
+
+    def get_count_queries(self, url):
+        """Возвращает ответ и запросы COUNT, выполненные для него."""
+        with CaptureQueriesContext(connection) as context:
+            response = self.guest_client.get(url)
+        return response, [
+            query['sql'] for query in context.captured_queries
+            if 'COUNT(*)' in query['sql']
+        ]
+
+    def test_exact_count_by_default(self):
+        response, count_queries = self.get_count_queries('/api/recipes/')
+        self.assertEqual(response.json()['count'], 5)
+        self.assertTrue(response.json()['count_is_exact'])
+        self.assertEqual(len(count_queries), 1)
+
+    @override_settings(PAGINATION_COUNT_CACHE_TIMEOUT=60)
+    def test_count_is_cached_per_filter_set(self):
+        """Количество кэшируется по набору фильтров без учёта страницы."""
+        self.get_count_queries('/api/recipes/?limit=2')
+        response, count_queries = self.get_count_queries(
+            '/api/recipes/?page=2&limit=2'
+        )
+        self.assertEqual(count_queries, [])
+        self.assertEqual(response.json()['count'], 5)
+        self.assertFalse(response.json()['count_is_exact'])
+        self.assertEqual(len(response.json()['results']), 2)
+        response, count_queries = self.get_count_queries(
+            f'/api/recipes/?author={self.user.id}'
+        )
+        self.assertEqual(len(count_queries), 1)
+        self.assertEqual(response.json()['count'], 0)
+
+    @override_settings(PAGINATION_COUNT_ESTIMATE_THRESHOLD=1)
+    def test_estimated_count(self):
+        """Выше порога количество берётся из оценки планировщика,
+        а ссылки на страницы определяются по выборке.
+        """
+        response, count_queries = self.get_count_queries(
+            '/api/recipes/?page=2&limit=2'
+        )
+        self.assertEqual(count_queries, [])
+        self.assertFalse(response.json()['count_is_exact'])
+        self.assertEqual(len(response.json()['results']), 2)
+        self.assertIsNotNone(response.json()['next'])
+        self.assertIsNotNone(response.json()['previous'])
+        response = self.guest_client.get('/api/recipes/?page=3&limit=2')
+        self.assertEqual(len(response.json()['results']), 1)
+        self.assertIsNone(response.json()['next'])
+        response = self.guest_client.get('/api/recipes/?page=4&limit=2')
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=60, RESPONSE_CACHE_MAX_AGE=5)
+class RecipeResponseCacheTests(RecipeAPITestCase):
+    """Тесты кэша ответов анонимным пользователям."""
+
+    def test_anonymous_responses_are_cached(self):
+        detail_url = f'/api/recipes/{self.recipes[0].id}/'
+        for url in ('/api/recipes/?limit=2', detail_url):
+            first = self.guest_client.get(url)
+            with self.assertNumQueries(0):
+                second = self.guest_client.get(url)
+            self.assertEqual(second.json(), first.json())
+            self.assertEqual(second['ETag'], first['ETag'])
+            self.assertIn('public', second['Cache-Control'])
+            self.assertIn('max-age=5', second['Cache-Control'])
+            self.assertIn('Authorization', second['Vary'])
+
+    def test_query_string_is_normalized(self):
+        self.guest_client.get('/api/recipes/?limit=2&page=2')
+        with self.assertNumQueries(0):
+            self.guest_client.get('/api/recipes/?page=2&limit=2')
+
+    def test_authenticated_responses_are_not_cached(self):
+        self.authorized_client.get('/api/recipes/')
+        response, queries = self.count_queries(
+            self.authorized_client, '/api/recipes/'
+        )
+        self.assertGreater(queries, 0)
+        self.assertNotIn('ETag', response)
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_not_modified(self):
+        url = f'/api/recipes/{self.recipes[0].id}/'
+        etag = self.guest_client.get(url)['ETag']
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_versions_expire(self):
+        """Номера версий для адресов несуществующих рецептов
+        не остаются в кэше навсегда.
+        """
+        response = self.guest_client.get('/api/recipes/0/')
+        self.assertEqual(response.status_code, 404)
+        self.assertIsNotNone(cache.get('version:recipes:0'))
+        expired = time.time() + VERSION_TIMEOUT + 1
+        with mock.patch('time.time', return_value=expired):
+            self.assertIsNone(cache.get('version:recipes:0'))
+
+    def test_recipe_change_invalidates_responses(self):
+        list_url = '/api/recipes/'
+        detail_url = f'/api/recipes/{self.recipes[0].id}/'
+        other_url = f'/api/recipes/{self.recipes[1].id}/'
+        etags = {
+            url: self.guest_client.get(url)['ETag']
+            for url in (list_url, detail_url, other_url)
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipes[0].name = 'Новое название'
+            self.recipes[0].save()
+        self.assertEqual(
+            self.guest_client.get(detail_url).json()['name'],
+            'Новое название'
+        )
+        self.assertNotEqual(
+            self.guest_client.get(list_url)['ETag'], etags[list_url]
+        )
+        self.assertEqual(
+            self.guest_client.get(other_url)['ETag'], etags[other_url]
+        )
+
+    def test_author_change_invalidates_responses(self):
+        url = f'/api/recipes/{self.recipes[0].id}/'
+        self.guest_client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipes[0].author.first_name = 'Новое имя'
+            self.recipes[0].author.save()
+        self.assertEqual(
+            self.guest_client.get(url).json()['author']['first_name'],
+            'Новое имя'
+        )
+
+    def test_favorite_invalidates_only_popular_ordering(self):
+        self.guest_client.get('/api/recipes/')
+        self.guest_client.get('/api/recipes/?ordering=popular')
+        with self.captureOnCommitCallbacks(execute=True):
+            Favorite.objects.create(user=self.user, recipe=self.recipes[-1])
+        with self.assertNumQueries(0):
+            self.guest_client.get('/api/recipes/')
+        response = self.guest_client.get('/api/recipes/?ordering=popular')
+        self.assertEqual(
+            response.json()['results'][0]['id'], self.recipes[-1].id
+        )
+
+
+@override_settings(
+    ROOT_URLCONF=__name__, REQUEST_METRICS=True, SLOW_REQUEST_THRESHOLD=0
+)
+@modify_settings(
+    MIDDLEWARE={'prepend': 'backend.metrics.RequestMetricsMiddleware'}
+)
+class RequestMetricsTests(RecipeAPITestCase):
+    """Тесты учёта запросов к базе данных и времени обработки."""
+
+    def test_server_timing(self):
+        response, queries = self.count_queries(
+            self.guest_client, '/api/recipes/'
+        )
+        self.assertIn(f'desc="{queries} queries"', response['Server-Timing'])
+        self.assertIn('serializer;dur=', response['Server-Timing'])
+        self.assertIn('total;dur=', response['Server-Timing'])
+
+    def get_metric(self, name):
+        return REGISTRY.get_sample_value(
+            name, {'view': 'recipe-list'}
+        ) or 0
+
+    def test_prometheus_metrics_by_view_name(self):
+        requests = self.get_metric('foodgram_requests_total')
+        db_queries = self.get_metric('foodgram_db_queries_total')
+        _, queries = self.count_queries(self.guest_client, '/api/recipes/')
+        self.guest_client.get('/api/recipes/')
+        self.assertEqual(
+            self.get_metric('foodgram_requests_total'), requests + 2
+        )
+        self.assertEqual(
+            self.get_metric('foodgram_db_queries_total'),
+            db_queries + queries * 2
+        )
+        content = self.guest_client.get('/metrics').content.decode()
+        self.assertIn('foodgram_requests_total{view="recipe-list"}', content)
+        self.assertIn(
+            'foodgram_serializer_seconds_total{view="recipe-list"}', content
+        )
+
+    async def test_async_requests(self):
+        """Под ASGI промежуточный слой работает в цикле событий
+        и учитывает SQL-запросы представления из другого потока.
+        """
+        async def get_response(request):
+            return None
+
+        self.assertTrue(
+            iscoroutinefunction(RequestMetricsMiddleware(get_response))
+        )
+        # Соединение тестовой базы открыто до подключения учёта,
+        # а асинхронный вариант не проверяет обёртки соединений.
+        await sync_to_async(install_query_wrapper)(connection)
+        response = await AsyncClient().get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(
+            response['Server-Timing'], r'desc="[1-9]\d* queries"'
+        )
+
+    @override_settings(SLOW_REQUEST_THRESHOLD=1)
+    def test_slow_request_is_logged_with_fingerprints(self):
+        with self.assertLogs('backend.metrics', 'WARNING') as logs:
+            self.authorized_client.get(
+                f'/api/recipes/?tags={self.tags[0].slug}&tags=tag1'
+            )
+        self.assertIn('(recipe-list)', logs.output[0])
+        self.assertIn('FROM "recipes_recipe"', logs.output[0])
+
+    @override_settings(ROOT_URLCONF='backend.urls', REQUEST_METRICS=False)
+    def test_metrics_are_disabled(self):
+        self.assertEqual(self.guest_client.get('/metrics').status_code, 404)
+
+    def test_disabled_metrics_add_no_wrappers(self):
+        """Без настройки REQUEST_METRICS импорт адресов и обработка
+        запроса не оборачивают сериализаторы и SQL-запросы.
+        """
+        code = (
+            'import django; django.setup()\n'
+            'from django.test import Client\n'
+            'from django.db.backends.signals import connection_created\n'
+            'from rest_framework.serializers import BaseSerializer\n'
+            'Client().get("/redoc/")\n'
+            'print(getattr(BaseSerializer.data.fget, "timed", False))\n'
+            'print(connection_created.disconnect(\n'
+            '    dispatch_uid="backend.metrics"))'
+        )
+        output = subprocess.run(
+            [sys.executable, '-c', code], check=True, capture_output=True,
+            text=True, env={
+                **os.environ, 'REQUEST_METRICS': 'False',
+                'DJANGO_SETTINGS_MODULE': 'backend.settings',
+            },
+        ).stdout
+        self.assertEqual(output.split(), ['False', 'False'])
+
+
+class RecipeFilterTests(RecipeAPITestCase):
+    """Тесты фильтрации рецептов."""
+
+    def get_ids(self, client, url):
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.json()['results']]
+
+    def test_several_tags_without_duplicates(self):
+        """Рецепт с несколькими выбранными тегами выводится один раз."""
+        self.recipes[0].tags.set([self.tags[0]])
+        response = self.guest_client.get(
+            '/api/recipes/?tags=tag0&tags=tag1&limit=10'
+        )
+        self.assertEqual(response.json()['count'], 5)
+        self.assertEqual(len(response.json()['results']), 5)
+        self.assertEqual(
+            self.get_ids(self.guest_client, '/api/recipes/?tags=tag1'),
+            [recipe.id for recipe in reversed(self.recipes[1:])]
+        )
+
+    def test_tags_are_resolved_from_catalog(self):
+        """Слаги тегов проверяются без запроса к таблице тегов."""
+        with CaptureQueriesContext(connection) as context:
+            self.guest_client.get('/api/recipes/?tags=tag0')
+        for query in context.captured_queries:
+            self.assertNotIn('"recipes_tag"."slug"', query['sql'])
+
+    def test_unknown_tag(self):
+        response = self.guest_client.get('/api/recipes/?tags=unknown')
+        self.assertEqual(response.status_code, 400)
+
+    def test_combined_filters(self):
+        Favorite.objects.create(user=self.user, recipe=self.recipes[1])
+        Favorite.objects.create(user=self.user, recipe=self.recipes[2])
+        self.recipes[2].tags.set([self.tags[0]])
+        ids = self.get_ids(
+            self.authorized_client,
+            f'/api/recipes/?tags=tag1&author={self.author.id}&is_favorited=1'
+        )
+        self.assertEqual(ids, [self.recipes[1].id])
+        self.assertEqual(
+            len(self.get_ids(
+                self.authorized_client, '/api/recipes/?is_favorited=0'
+            )),
+            5
+        )
+
+    def test_favorite_filter_for_anonymous_user(self):
+        self.assertEqual(
+            self.get_ids(self.guest_client, '/api/recipes/?is_favorited=1'),
+            []
+        )
+
+
+class RecipeIndexTests(RecipeAPITestCase):
+    """
+    Тесты использования индексов основными запросами.
+    В тестовой базе мало строк, поэтому последовательное сканирование
+    отключается, чтобы план показывал, какие индексы подходят запросу.
+    """
+
+    def get_plans(self, client, url):
+        """Возвращает планы всех запросов, выполненных для url."""
+        with CaptureQueriesContext(connection) as context:
+            client.get(url)
+        plans = []
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            for query in context.captured_queries:
+                cursor.execute(f'EXPLAIN {query["sql"]}')
+                plans.append('\n'.join(row[0] for row in cursor.fetchall()))
+        return plans
+
+    def assertIndexUsed(self, plans, index_name):
+        self.assertTrue(
+            any(index_name in plan for plan in plans),
+            f'{index_name} не используется:\n' + '\n\n'.join(plans)
+        )
+
+    def assertNoSeqScan(self, plans):
+        for plan in plans:
+            self.assertNotIn('Seq Scan', plan)
+
+    def test_feed_uses_indexes(self):
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+        plans = self.get_plans(self.authorized_client, '/api/recipes/')
+        self.assertNoSeqScan(plans)
+        self.assertIndexUsed(plans, 'recipe_pub_date_id_idx')
+        self.assertIndexUsed(plans, 'unique_recipe_ingredient')
+
+    def test_combined_filters_use_indexes(self):
+        """Фильтры по тегам, автору и избранному обслуживаются индексами."""
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+        plans = self.get_plans(
+            self.authorized_client,
+            f'/api/recipes/?tags=tag0&tags=tag1&author={self.author.id}'
+            f'&is_favorited=1'
+        )
+        self.assertNoSeqScan(plans)
+        self.assertIndexUsed(plans, 'recipe_author_pub_date_idx')
+        self.assertIndexUsed(plans, 'recipe_tags_tag_recipe_idx')
+
+    def test_reverse_lookups_use_indexes(self):
+        """Поиск пользователей, добавивших рецепт в избранное
+        или в список покупок, использует обратные индексы.
+        """
+        recipe = self.recipes[0]
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        self.assertIn(
+            'favorite_recipe_user_idx',
+            Favorite.objects.filter(recipe=recipe).values('user').explain()
+        )
+        self.assertIn(
+            'purchase_recipe_user_idx',
+            Purchase.objects.filter(recipe=recipe).values('user').explain()
+        )
+
+    def test_amount_is_unique(self):
+        with self.assertRaises(IntegrityError):
+            Amount.objects.create(
+                recipe=self.recipes[0],
+                ingredient=self.ingredients[0],
+                amount=1
+            )
+
+
+class DownloadShoppingCartTests(RecipeAPITestCase):
+    """Тесты скачивания списка покупок."""
+
+    url = '/api/recipes/download_shopping_cart/'
+
+    def setUp(self):
+        super().setUp()
+        for recipe in self.recipes[:2]:
+            self.authorized_client.get(
+                f'/api/recipes/{recipe.id}/shopping_cart/'
+            )
+        self.token = Token.objects.create(user=self.user)
+
+    def get_content(self, url):
+        response = self.authorized_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_text_is_default_format(self):
+        """Ингредиенты суммируются по всем рецептам из списка покупок."""
+        response, content = self.get_content(self.url)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        lines = content.decode().splitlines()
+        self.assertEqual(len(lines), len(self.ingredients))
+        self.assertIn('ингредиент 0 - 200 г', lines)
+
+    def test_csv_format(self):
+        """Список покупок доступен в формате CSV."""
+        response, content = self.get_content(f'{self.url}?format=csv')
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        lines = content.decode().splitlines()
+        self.assertEqual(len(lines), len(self.ingredients) + 1)
+        self.assertIn('ингредиент 1,200,г', lines)
+
+    def test_pdf_format(self):
+        """Список покупок доступен в формате PDF."""
+        response, content = self.get_content(f'{self.url}?format=pdf')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(content.startswith(b'%PDF'))
+
+    def test_anonymous_user_is_rejected(self):
+        """Анонимный пользователь не может скачать список покупок."""
+        response = self.guest_client.get(self.url)
+        self.assertEqual(response.status_code, 401)
+
+    async def test_asgi_download_is_streamed_asynchronously(self):
+        """Под ASGI файл отдаётся асинхронным итератором."""
+        response = await AsyncClient().get(
+            f'{self.url}?format=csv', AUTHORIZATION=f'Token {self.token.key}'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        content = b''.join([
+            chunk async for chunk in response.streaming_content
+        ])
+        self.assertIn('ингредиент 1,200,г', content.decode().splitlines())
+
+    async def test_asgi_pdf_is_built_outside_event_loop(self):
+        """Под ASGI PDF строится в потоке пула, а не в цикле событий."""
+        threads = []
+        stream = PDFShoppingCartRenderer.stream
+
+        def recording_stream(renderer, ingredients):
+            threads.append(threading.get_ident())
+            yield from stream(renderer, ingredients)
+
+        with mock.patch.object(
+                PDFShoppingCartRenderer, 'stream', recording_stream
+        ):
+            response = await AsyncClient().get(
+                f'{self.url}?format=pdf',
+                AUTHORIZATION=f'Token {self.token.key}'
+            )
+            content = b''.join([
+                chunk async for chunk in response.streaming_content
+            ])
+        self.assertTrue(content.startswith(b'%PDF'))
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], threading.get_ident())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ShoppingCartTotalsTests(RecipeAPITestCase):
+    """Тесты таблицы суммарных количеств ингредиентов в списке покупок."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        super().setUp()
+        self.author_client = APIClient()
+        self.author_client.force_authenticate(self.author)
+        for recipe in self.recipes[:2]:
+            self.authorized_client.get(
+                f'/api/recipes/{recipe.id}/shopping_cart/'
+            )
+
+    def get_totals(self):
+        return dict(
+            ShoppingCartItem.objects.filter(user=self.user).values_list(
+                'ingredient_id', 'total'
+            )
+        )
+
+    def test_totals_follow_shopping_cart(self):
+        """Добавление и удаление рецептов меняет суммы ингредиентов."""
+        self.assertEqual(
+            self.get_totals(),
+            {ingredient.id: 200 for ingredient in self.ingredients}
+        )
+        self.authorized_client.delete(
+            f'/api/recipes/{self.recipes[0].id}/shopping_cart/'
+        )
+        self.assertEqual(
+            self.get_totals(),
+            {ingredient.id: 100 for ingredient in self.ingredients}
+        )
+        self.authorized_client.delete(
+            f'/api/recipes/{self.recipes[1].id}/shopping_cart/'
+        )
+        self.assertEqual(self.get_totals(), {})
+
+    def test_totals_follow_recipe_update(self):
+        """Изменение ингредиентов рецепта меняет списки покупок."""
+        first, second, third = self.ingredients
+        response = self.author_client.put(
+            f'/api/recipes/{self.recipes[0].id}/',
+            {
+                'ingredients': [
+                    {'id': first.id, 'amount': 150},
+                    {'id': third.id, 'amount': 100},
+                ],
+                'tags': [self.tags[0].id],
+                'image': make_image_payload(),
+                'name': 'Новое название',
+                'text': 'Описание',
+                'cooking_time': 5,
+            },
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.get_totals(),
+            {first.id: 250, second.id: 100, third.id: 200}
+        )
+
+    def test_totals_follow_recipe_delete(self):
+        """Удаление рецепта убирает его ингредиенты из списков покупок."""
+        self.author_client.delete(f'/api/recipes/{self.recipes[0].id}/')
+        self.assertEqual(
+            self.get_totals(),
+            {ingredient.id: 100 for ingredient in self.ingredients}
+        )
+
+    def test_totals_follow_author_delete(self):
+        """Удаление автора каскадно убирает его рецепты
+        из списков покупок других пользователей.
+        """
+        self.author.delete()
+        self.assertEqual(self.get_totals(), {})
+        call_command('shopping_cart_totals', stdout=StringIO())
+
+    def test_totals_follow_amount_changes(self):
+        """Изменения ингредиентов рецепта в обход API, например
+        в админке, переносятся в списки покупок.
+        """
+        first, second, third = self.ingredients
+        amount = Amount.objects.get(recipe=self.recipes[0], ingredient=first)
+        amount.amount = 150
+        amount.save()
+        amount = Amount.objects.get(recipe=self.recipes[0], ingredient=second)
+        amount.ingredient = Ingredient.objects.create(
+            name='соль', measurement_unit=first.measurement_unit
+        )
+        amount.save()
+        third.delete()
+        self.assertEqual(
+            self.get_totals(),
+            {first.id: 250, second.id: 100, amount.ingredient_id: 100}
+        )
+        call_command('shopping_cart_totals', stdout=StringIO())
+
+    def test_command_verifies_and_rebuilds_totals(self):
+        """Команда находит расхождения и пересобирает таблицу."""
+        call_command('shopping_cart_totals', stdout=StringIO())
+        ShoppingCartItem.objects.filter(user=self.user).update(total=1)
+        with self.assertRaises(CommandError):
+            call_command('shopping_cart_totals', stdout=StringIO())
+        call_command('shopping_cart_totals', '--rebuild', stdout=StringIO())
+        call_command('shopping_cart_totals', stdout=StringIO())
+        self.assertEqual(
+            self.get_totals(),
+            {ingredient.id: 200 for ingredient in self.ingredients}
+        )
+
+    def test_command_for_user(self):
+        """Команда с --user не умножает суммы на число пользователей,
+        добавивших рецепт в список покупок.
+        """
+        self.author_client.get(
+            f'/api/recipes/{self.recipes[0].id}/shopping_cart/'
+        )
+        user = str(self.user.id)
+        call_command('shopping_cart_totals', '--user', user, stdout=StringIO())
+        call_command(
+            'shopping_cart_totals', '--rebuild', '--user', user,
+            stdout=StringIO()
+        )
+        self.assertEqual(
+            self.get_totals(),
+            {ingredient.id: 200 for ingredient in self.ingredients}
+        )
+        call_command('shopping_cart_totals', stdout=StringIO())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class RecipeWriteTests(RecipeAPITestCase):
+    """Тесты создания и обновления рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        unit = Unit.objects.create(name='шт')
+        cls.many_ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'продукт {i}', measurement_unit=unit)
+            for i in range(20)
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.author_client = APIClient()
+        self.author_client.force_authenticate(self.author)
+
+    def get_payload(self, ingredients, name='Рецепт'):
+        return {
+            'ingredients': [
+                {'id': ingredient.id, 'amount': amount}
+                for ingredient, amount in ingredients
+            ],
+            'tags': [tag.id for tag in self.tags],
+            'image': make_image_payload(),
+            'name': name,
+            'text': 'Описание',
+            'cooking_time': 5,
+        }
+
+    def test_create_queries_do_not_depend_on_ingredients(self):
+        """Создание рецепта не выполняет запросов на каждый ингредиент."""
+        def create_queries(ingredients, name):
+            with CaptureQueriesContext(connection) as context:
+                response = self.author_client.post(
+                    '/api/recipes/',
+                    self.get_payload(ingredients, name),
+                    format='json'
+                )
+            self.assertEqual(response.status_code, 201)
+            return len(context.captured_queries)
+
+        few = create_queries(
+            [(ingredient, 1) for ingredient in self.many_ingredients[:2]],
+            'Мало ингредиентов'
+        )
+        many = create_queries(
+            [(ingredient, 1) for ingredient in self.many_ingredients],
+            'Много ингредиентов'
+        )
+        self.assertEqual(few, many)
+
+    def test_update_applies_ingredient_diff(self):
+        """Обновление меняет только изменившиеся ингредиенты."""
+        recipe = self.recipes[0]
+        first, second, _ = self.ingredients
+        kept = Amount.objects.get(recipe=recipe, ingredient=first)
+        response = self.author_client.put(
+            f'/api/recipes/{recipe.id}/',
+            self.get_payload(
+                [(first, 100), (second, 50), (self.many_ingredients[0], 3)]
+            ),
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            dict(recipe.amount_ingredients.values_list(
+                'ingredient_id', 'amount'
+            )),
+            {first.id: 100, second.id: 50, self.many_ingredients[0].id: 3}
+        )
+        self.assertTrue(Amount.objects.filter(id=kept.id).exists())
+
+    def test_unknown_ingredient_is_rejected(self):
+        """Несуществующий ингредиент приводит к ошибке валидации."""
+        payload = self.get_payload([(self.ingredients[0], 1)])
+        payload['ingredients'].append({'id': 0, 'amount': 1})
+        response = self.author_client.post(
+            '/api/recipes/', payload, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Recipe.objects.filter(name='Рецепт').exists())
+
+
+class RecipeCounterTests(RecipeAPITestCase):
+    """Тесты счётчиков избранного и списков покупок."""
+
+    def get_counters(self, recipe):
+        recipe.refresh_from_db()
+        return recipe.favorites_count, recipe.in_carts_count
+
+    def test_counters_follow_api(self):
+        recipe = self.recipes[0]
+        self.authorized_client.get(f'/api/recipes/{recipe.id}/favorite/')
+        self.authorized_client.get(
+            f'/api/recipes/{recipe.id}/shopping_cart/'
+        )
+        self.assertEqual(self.get_counters(recipe), (1, 1))
+        self.authorized_client.delete(f'/api/recipes/{recipe.id}/favorite/')
+        self.assertEqual(self.get_counters(recipe), (0, 1))
+        self.authorized_client.delete(
+            f'/api/recipes/{recipe.id}/shopping_cart/'
+        )
+        self.assertEqual(self.get_counters(recipe), (0, 0))
+
+    def test_cascade_delete_decrements_counters(self):
+        recipe = self.recipes[0]
+        Favorite.objects.create(user=self.user, recipe=recipe)
+        Purchase.objects.create(user=self.user, recipe=recipe)
+        self.user.delete()
+        self.assertEqual(self.get_counters(recipe), (0, 0))
+
+    def test_recipe_save_keeps_counters(self):
+        """Сохранение рецепта не перезаписывает изменённые счётчики."""
+        recipe = Recipe.objects.get(pk=self.recipes[0].pk)
+        Favorite.objects.create(user=self.user, recipe=recipe)
+        recipe.name = 'Новое название'
+        recipe.save()
+        self.assertEqual(self.get_counters(recipe), (1, 0))
+
+    def test_popular_ordering(self):
+        Favorite.objects.create(user=self.user, recipe=self.recipes[1])
+        Favorite.objects.create(user=self.author, recipe=self.recipes[1])
+        Favorite.objects.create(user=self.user, recipe=self.recipes[3])
+        Purchase.objects.create(user=self.user, recipe=self.recipes[0])
+        expected = [self.recipes[i].id for i in (1, 3, 0, 4, 2)]
+        response = self.guest_client.get(
+            '/api/recipes/?ordering=popular&limit=10'
+        )
+        self.assertEqual(
+            [item['id'] for item in response.json()['results']], expected
+        )
+        ids = []
+        url = '/api/recipes/?ordering=popular&pagination=cursor&limit=2'
+        while url:
+            response = self.guest_client.get(url)
+            ids += [item['id'] for item in response.json()['results']]
+            url = response.json()['next']
+        self.assertEqual(ids, expected)
+
+    def test_command_verifies_and_rebuilds_counters(self):
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+        call_command('recipe_counters', stdout=StringIO())
+        Recipe.objects.update(favorites_count=5)
+        with self.assertRaises(CommandError):
+            call_command('recipe_counters', stdout=StringIO())
+        call_command('recipe_counters', '--rebuild', stdout=StringIO())
+        call_command('recipe_counters', stdout=StringIO())
+        self.assertEqual(self.get_counters(self.recipes[0]), (1, 0))
+        self.assertEqual(self.get_counters(self.recipes[1]), (0, 0))
+
+
+class RecipeSearchTests(RecipeAPITestCase):
+    """Тесты полнотекстового поиска рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.soup = Recipe.objects.create(
+            author=cls.author,
+            name='Борщ',
+            text='Густой суп со сметаной',
+            cooking_time=60,
+            image='recipes/test.png',
+        )
+        beet = Ingredient.objects.create(
+            name='свёкла', measurement_unit=cls.ingredients[0].measurement_unit
+        )
+        Amount.objects.create(recipe=cls.soup, ingredient=beet, amount=300)
+        cls.salad = Recipe.objects.create(
+            author=cls.author,
+            name='Винегрет',
+            text='Салат, в котором есть борщевые овощи',
+            cooking_time=20,
+            image='recipes/test.png',
+        )
+        Amount.objects.create(recipe=cls.salad, ingredient=beet, amount=100)
+        update_search_vector(Recipe.objects.all())
+
+    def search(self, query):
+        response = self.guest_client.get(
+            '/api/recipes/', {'search': query, 'limit': 10}
+        )
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.json()['results']]
+
+    def test_search_by_name_text_and_ingredients(self):
+        self.assertEqual(self.search('борщ'), [self.soup.id])
+        self.assertEqual(self.search('супы'), [self.soup.id])
+        self.assertEqual(
+            set(self.search('свёкла')), {self.soup.id, self.salad.id}
+        )
+
+    def test_results_are_ranked(self):
+        """Совпадение в названии важнее совпадения в описании."""
+        self.soup.text = 'Суп со свёклой'
+        self.soup.save()
+        self.salad.name = 'Винегрет со свёклой'
+        self.salad.save()
+        update_search_vector(Recipe.objects.all())
+        self.assertEqual(
+            self.search('свёкла'), [self.salad.id, self.soup.id]
+        )
+
+    def test_vector_follows_api_update(self):
+        self.authorized_client.force_authenticate(self.author)
+        response = self.authorized_client.patch(
+            f'/api/recipes/{self.salad.id}/',
+            {
+                'name': 'Окрошка',
+                'text': 'Холодный суп на квасе',
+                'cooking_time': 15,
+                'tags': [self.tags[0].id],
+                'ingredients': [
+                    {'id': self.ingredients[0].id, 'amount': 100}
+                ],
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.search('окрошка'), [self.salad.id])
+        self.assertNotIn(self.salad.id, self.search('свёкла'))
+
+    def test_vector_follows_ingredient_rename(self):
+        ingredient = self.ingredients[0]
+        ingredient.name = 'картофель'
+        ingredient.save()
+        self.assertEqual(len(self.search('картофель')), 5)
+
+    def test_search_uses_gin_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = search_recipes(Recipe.objects.all(), 'борщ').explain()
+        self.assertIn('recipe_search_vector_idx', plan)
+
+    def test_search_is_combined_with_filters(self):
+        response = self.guest_client.get(
+            '/api/recipes/', {'search': 'свёкла', 'author': self.user.id}
+        )
+        self.assertEqual(response.json()['count'], 0)
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT, RECIPE_IMAGE_RENDITION_WORKERS=0
+)
+class RecipeImageTests(RecipeAPITestCase):
+    """Тесты загрузки изображений и построения уменьшенных копий."""
+
+    def setUp(self):
+        super().setUp()
+        self.author_client = APIClient()
+        self.author_client.force_authenticate(self.author)
+
+    def create_recipe(self, image):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.author_client.post(
+                '/api/recipes/',
+                {
+                    'ingredients': [
+                        {'id': self.ingredients[0].id, 'amount': 10}
+                    ],
+                    'tags': [self.tags[0].id],
+                    'image': image,
+                    'name': 'Рецепт с фото',
+                    'text': 'Описание',
+                    'cooking_time': 5,
+                },
+                format='json',
+            )
+
+    def test_renditions_are_built(self):
+        response = self.create_recipe(make_image_payload((1200, 800)))
+        self.assertEqual(response.status_code, 201)
+        recipe = Recipe.objects.get(pk=response.json()['id'])
+        self.assertEqual(recipe.renditions['source'], recipe.image.name)
+        storage = recipe.image.storage
+        with storage.open(recipe.renditions['small']['webp']) as file:
+            self.assertEqual(Image.open(file).size, (320, 213))
+        with storage.open(recipe.renditions['medium']['jpeg']) as file:
+            image = Image.open(file)
+            self.assertEqual((image.format, image.size), ('JPEG', (960, 640)))
+        renditions = self.guest_client.get(
+            f'/api/recipes/{recipe.id}/'
+        ).json()['image_renditions']
+        self.assertEqual(set(renditions), {'small', 'medium'})
+        self.assertEqual(
+            renditions['small']['webp'],
+            storage.url(recipe.renditions['small']['webp'])
+        )
+        response = self.guest_client.get('/api/recipes/?limit=1')
+        self.assertEqual(
+            response.json()['results'][0]['image_renditions'], renditions
+        )
+
+    def test_stale_renditions_are_hidden(self):
+        """Копии прежнего изображения не отдаются до построения новых."""
+        recipe = self.recipes[0]
+        Recipe.objects.filter(pk=recipe.pk).update(
+            renditions={'source': 'recipes/old.png', 'small': {}}
+        )
+        response = self.guest_client.get(f'/api/recipes/{recipe.id}/')
+        self.assertEqual(response.json()['image_renditions'], {})
+
+    @override_settings(RECIPE_IMAGE_MAX_SIZE=100)
+    def test_image_size_is_limited(self):
+        response = self.create_recipe(make_image_payload((200, 200)))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.json())
+
+    def test_invalid_base64_is_rejected(self):
+        response = self.create_recipe('data:image/png;base64,не base64')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.json())
+
+    def test_base64_is_decoded_in_chunks(self):
+        """Декодирование не держит в памяти изображение целиком."""
+        buffer = BytesIO()
+        Image.frombytes('RGB', (1000, 1000), os.urandom(3000000)).save(
+            buffer, format='PNG'
+        )
+        payload = base64.b64encode(buffer.getvalue()).decode()
+        field = RecipeImageField()
+        # Первый вызов импортирует модули Pillow.
+        field.to_internal_value(make_image_payload()).close()
+        tracemalloc.start()
+        try:
+            file = field.to_internal_value(payload)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(file.size, len(buffer.getvalue()))
+        self.assertLess(peak, len(buffer.getvalue()) // 4)
+        file.close()
+
+    def test_line_wrapped_base64(self):
+        """Переносы строк допускаются в любом месте строки base64."""
+        buffer = BytesIO()
+        Image.frombytes('RGB', (200, 200), os.urandom(120000)).save(
+            buffer, format='PNG'
+        )
+        payload = base64.b64encode(buffer.getvalue()).decode()
+        position = 70001
+        payload = f'{payload[:position]}\n{payload[position:]}'
+        file = RecipeImageField().to_internal_value(payload)
+        self.assertEqual(file.size, len(buffer.getvalue()))
+        file.close()
+
+    def test_multipart_upload(self):
+        buffer = BytesIO()
+        Image.new('RGB', (400, 300), 'white').save(buffer, format='JPEG')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.author_client.post(
+                '/api/recipes/',
+                {
+                    'ingredients': json.dumps(
+                        [{'id': self.ingredients[0].id, 'amount': 10}]
+                    ),
+                    'tags': [self.tags[0].id, self.tags[1].id],
+                    'image': SimpleUploadedFile(
+                        'photo.jpg', buffer.getvalue(), 'image/jpeg'
+                    ),
+                    'name': 'Рецепт из формы',
+                    'text': 'Описание',
+                    'cooking_time': 5,
+                },
+                format='multipart',
+            )
+        self.assertEqual(response.status_code, 201)
+        recipe = Recipe.objects.get(pk=response.json()['id'])
+        self.assertEqual(recipe.tags.count(), 2)
+        self.assertEqual(recipe.amount_ingredients.get().amount, 10)
+        self.assertEqual(recipe.renditions['source'], recipe.image.name)
+
+    def test_multipart_invalid_ingredients(self):
+        response = self.author_client.post(
+            '/api/recipes/',
+            {
+                'ingredients': '[{',
+                'tags': [self.tags[0].id],
+                'name': 'Рецепт из формы',
+                'text': 'Описание',
+                'cooking_time': 5,
+            },
+            format='multipart',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ingredients', response.json())
+
+    def test_same_image_is_stored_once(self):
+        """Повторно загруженное изображение не записывается заново."""
+        payload = make_image_payload((400, 300))
+        first = Recipe.objects.get(pk=self.create_recipe(payload).json()['id'])
+        storage = first.image.storage
+        path = storage.path(first.image.name)
+        os.utime(path, (0, 0))
+        inode = os.stat(path).st_ino
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.author_client.patch(
+                f'/api/recipes/{first.id}/',
+                {
+                    'ingredients': [
+                        {'id': self.ingredients[0].id, 'amount': 20}
+                    ],
+                    'tags': [self.tags[0].id],
+                    'image': payload,
+                    'name': 'Рецепт с фото',
+                    'text': 'Новое описание',
+                    'cooking_time': 5,
+                },
+                format='json',
+            )
+        self.assertEqual(response.status_code, 200)
+        updated = Recipe.objects.get(pk=first.id)
+        self.assertEqual(updated.image.name, first.image.name)
+        self.assertEqual(updated.renditions, first.renditions)
+        self.assertEqual(os.stat(path).st_ino, inode)
+        self.assertGreater(os.stat(path).st_mtime, 0)
+
+    def test_gc_deletes_orphans(self):
+        recipe = Recipe.objects.get(
+            pk=self.create_recipe(make_image_payload()).json()['id']
+        )
+        storage = recipe.image.storage
+        orphan = storage.save('recipes/orphan.png', ContentFile(b'orphan'))
+        call_command(
+            'recipe_images_gc', '--min-age', '0', '--dry-run',
+            stdout=StringIO()
+        )
+        self.assertTrue(storage.exists(orphan))
+        call_command('recipe_images_gc', '--min-age', '0', stdout=StringIO())
+        self.assertFalse(storage.exists(orphan))
+        self.assertTrue(storage.exists(recipe.image.name))
+        self.assertTrue(storage.exists(recipe.renditions['small']['webp']))
+
+    def test_gc_keeps_orphan_uploaded_again(self):
+        """Старый неиспользуемый файл, загруженный повторно,
+        не удаляется до истечения --min-age.
+        """
+        storage = Recipe._meta.get_field('image').storage
+        orphan = storage.save('recipes/orphan.png', ContentFile(b'orphan'))
+        os.utime(storage.path(orphan), (0, 0))
+        self.assertEqual(
+            storage.save('recipes/again.png', ContentFile(b'orphan')), orphan
+        )
+        call_command('recipe_images_gc', '--min-age', '60', stdout=StringIO())
+        self.assertTrue(storage.exists(orphan))
+
+    def test_command_builds_missing_renditions(self):
+        response = self.create_recipe(make_image_payload((400, 400)))
+        Recipe.objects.filter(pk=response.json()['id']).update(renditions={})
+        Recipe.objects.exclude(pk=response.json()['id']).update(image='')
+        call_command('recipe_renditions', stdout=StringIO())
+        recipe = Recipe.objects.get(pk=response.json()['id'])
+        self.assertEqual(recipe.renditions['source'], recipe.image.name)
+
+
+class TagCatalogTests(RecipeAPITestCase):
+    """Тесты кэша справочника тегов."""
+
+    def test_tags_are_served_from_cache(self):
+        """Повторный запрос тегов не обращается к базе данных."""
+        self.authorized_client.get('/api/tags/')
+        with self.assertNumQueries(0):
+            response = self.authorized_client.get('/api/tags/')
+        self.assertEqual(len(response.json()), len(self.tags))
+
+    def test_conditional_request(self):
+        """Клиент с актуальной версией получает ответ 304."""
+        response = self.authorized_client.get(f'/api/tags/{self.tags[0].id}/')
+        self.assertEqual(response.json()['slug'], 'tag0')
+        response = self.authorized_client.get(
+            '/api/tags/', HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertIn('Last-Modified', response)
+
+    def test_cache_is_invalidated_on_change(self):
+        """Изменение тега сбрасывает кэш и меняет ETag."""
+        response = self.authorized_client.get('/api/tags/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tags[0].name = 'Новое название'
+            self.tags[0].save()
+            # До фиксации транзакции версия справочника не меняется.
+            self.assertEqual(
+                self.authorized_client.get('/api/tags/')['ETag'],
+                response['ETag']
+            )
+        new_response = self.authorized_client.get('/api/tags/')
+        self.assertNotEqual(response['ETag'], new_response['ETag'])
+        self.assertEqual(new_response.json()[0]['name'], 'Новое название')
+        recipe = self.authorized_client.get(
+            f'/api/recipes/{self.recipes[0].id}/'
+        )
+        self.assertEqual(recipe.json()['tags'][0]['name'], 'Новое название')
+
+    def test_version_is_read_once(self):
+        """Условный запрос читает версию справочника из кэша один раз,
+        и ETag относится к той же версии, что и данные.
+        """
+        response = self.authorized_client.get('/api/tags/')
+        with mock.patch.object(
+                tag_catalog, 'get_version', wraps=tag_catalog.get_version
+        ) as get_version:
+            response = self.authorized_client.get(
+                '/api/tags/', HTTP_IF_NONE_MATCH=response['ETag']
+            )
+            self.assertEqual(response.status_code, 304)
+            response = self.authorized_client.get('/api/tags/')
+        self.assertEqual(get_version.call_count, 2)
+        self.assertEqual(
+            response['ETag'], f'"tags-{tag_catalog.get_version()}"'
+        )
+
+    def test_unknown_tag(self):
+        response = self.authorized_client.get('/api/tags/0/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_async_view(self):
+        """Асинхронное представление выполняет DRF в пуле потоков
+        и отдаёт те же данные.
+        """
+        self.addCleanup(
+            lambda: get_executor().submit(connections.close_all).result()
+        )
+        view = TagViewSet.as_async_view({'get': 'list'})
+        request = AsyncRequestFactory().get('/api/tags/')
+        force_authenticate(request, self.user)
+        response = async_to_sync(view)(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            json.loads(response.content),
+            self.authorized_client.get('/api/tags/').json()
+        )
+
+    @override_settings(DB_CONN_MAX_AGE=120)
+    def test_pool_threads_keep_connections(self):
+        """Потоки пула переиспользуют соединения DB_CONN_MAX_AGE секунд
+        независимо от CONN_MAX_AGE остальных потоков.
+        """
+        result = {}
+
+        def run():
+            keep_connections()
+            result['max_age'] = connection.settings_dict['CONN_MAX_AGE']
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+        self.assertEqual(result['max_age'], 120)
+        self.assertNotEqual(connection.settings_dict['CONN_MAX_AGE'], 120)
+
+
+class ConnectionReuseTests(TransactionTestCase):
+    """
+    Тесты счётчиков соединений с базой данных. Запросы выполняются
+    обработчиком WSGI без тестового клиента, который не закрывает
+    соединения после запроса, и вне транзакции теста.
+    """
+
+    def get_counts(self):
+        return [
+            REGISTRY.get_sample_value(name, {'alias': 'default'}) or 0
+            for name in (
+                'foodgram_db_connections_created_total',
+                'foodgram_db_connections_reused_total',
+            )
+        ]
+
+    def serve(self, max_age):
+        """Выполняет два запроса и возвращает изменение счётчиков."""
+        connection.close()
+        self.addCleanup(connection.close)
+        handler = WSGIHandler()
+        before = self.get_counts()
+        with mock.patch.dict(connection.settings_dict, CONN_MAX_AGE=max_age):
+            for _ in range(2):
+                request = RequestFactory().get('/api/recipes/')
+                response = handler(request.environ, lambda *args: None)
+                self.assertEqual(response.status_code, 200)
+                response.close()
+        return [
+            after - count for after, count in zip(self.get_counts(), before)
+        ]
+
+    def test_connection_is_reused(self):
+        self.assertEqual(self.serve(60), [1, 1])
+
+    def test_connection_per_request(self):
+        self.assertEqual(self.serve(0), [2, 0])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BenchmarkTests(TransactionTestCase):
+    """
+    Тесты команд seed_data и benchmark. Выполняются после остальных
+    тестов с очисткой таблиц: откаченные вставки большого числа строк
+    оставляют в таблицах страницы, меняющие планы запросов в тестах
+    индексов.
+    """
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def seed(self, seed=0):
+        call_command(
+            'seed_data', '--users', '8', '--recipes', '30',
+            '--seed', str(seed), stdout=StringIO()
+        )
+
+    def test_seed_data(self):
+        self.seed()
+        self.assertEqual(User.objects.count(), 8)
+        self.assertEqual(Recipe.objects.count(), 30)
+        recipe = Recipe.objects.first()
+        self.assertGreaterEqual(recipe.amount_ingredients.count(), 3)
+        self.assertEqual(
+            recipe.favorites_count,
+            Favorite.objects.filter(recipe=recipe).count()
+        )
+        names = list(Recipe.objects.order_by('id').values_list(
+            'name', flat=True
+        ))
+        Recipe.objects.all().delete()
+        User.objects.all().delete()
+        self.seed()
+        self.assertEqual(
+            list(Recipe.objects.order_by('id').values_list(
+                'name', flat=True
+            )),
+            names
+        )
+
+    def test_benchmark(self):
+        self.seed()
+        recipes_dir = os.path.join(TEMP_MEDIA_ROOT, 'recipes')
+        images = set(os.listdir(recipes_dir))
+        output = os.path.join(TEMP_MEDIA_ROOT, 'benchmark.json')
+        call_command(
+            'benchmark', '--iterations', '1', '--output', output,
+            stdout=StringIO()
+        )
+        with open(output, encoding='utf-8') as file:
+            results = json.load(file)
+        self.assertEqual(results['dataset']['recipes'], 30)
+        self.assertIn('recipe_create', results['scenarios'])
+        for result in results['scenarios'].values():
+            self.assertLessEqual(result['queries'], result['max_queries'])
+        self.assertEqual(Recipe.objects.count(), 30)
+        self.assertEqual(set(os.listdir(recipes_dir)), images)
+        stderr = StringIO()
+        call_command(
+            'benchmark', '--iterations', '1', '--scenario', 'detail',
+            '--compare', output, stdout=StringIO(), stderr=stderr
+        )
+        self.assertIn('detail:', stderr.getvalue())
+
+    def test_benchmark_requires_data(self):
+        with self.assertRaises(CommandError):
+            call_command('benchmark', stdout=StringIO())
@@ -1,6 +1,8 @@
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Value
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import mixins, status, viewsets
@@ -8,18 +10,27 @@ from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from backend.async_views import AsyncViewSetMixin
+from backend.cache import (AnonymousResponseCacheMixin, CatalogViewMixin,
+                           get_versions)
+from .catalogs import tag_catalog
 from .filters import RecipeFilter
 from .models import Favorite, Purchase, Recipe, Tag
-from .pagination import CustomPagination
+from .pagination import RecipePagination
 from .permissions import AuthorOrReadOnly
 from .serializers import (FavoriteSerializer, PurchaseSerializer,
                           RecipeChangeSerializer, RecipeReadSerializer,
-                          RecipeSerializer, TagSerializer)
+                          RecipeSerializer, TagSerializer,
+                          get_ingredients_prefetch, get_tags_prefetch)
+from .shopping_cart import (SHOPPING_CART_RENDERERS,
+                            get_shopping_cart_ingredients, stream_async)
 
 User = get_user_model()
 
 
 class TagViewSet(
+    AsyncViewSetMixin,
+    CatalogViewMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     viewsets.GenericViewSet
@@ -27,15 +38,58 @@ class TagViewSet(
     serializer_class = TagSerializer
     queryset = Tag.objects.all()
     pagination_class = None
+    catalog = tag_catalog
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+    AsyncViewSetMixin,
+    AnonymousResponseCacheMixin,
+    viewsets.ModelViewSet
+):
     permission_classes = (AuthorOrReadOnly,)
     queryset = Recipe.objects.all()
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     serializer_class = RecipeReadSerializer
-    pagination_class = CustomPagination
+    pagination_class = RecipePagination
+
+    def get_cache_versions(self):
+        """Ответы анонимным пользователям зависят от справочников,
+        от рецепта или, для списков, от всех рецептов, а при сортировке
+        по популярности - ещё и от счётчиков избранного и покупок.
+        """
+        if self.action == 'retrieve':
+            return get_versions('recipes', f'recipes:{self.kwargs["pk"]}')
+        names = ['recipes', 'recipes:list']
+        if self.request.query_params.get('ordering') == 'popular':
+            names.append('recipes:popular')
+        return get_versions(*names)
+
+    def get_queryset(self):
+        """Аннотирует рецепты флагами is_favorited и is_in_shopping_cart,
+        чтобы страница рецептов не требовала отдельных запросов
+        для каждого рецепта. Для списка и детального просмотра
+        заранее загружает автора, теги и ингредиенты.
+        """
+        user = self.request.user
+        queryset = Recipe.objects.all()
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.select_related('author').prefetch_related(
+                get_tags_prefetch(), get_ingredients_prefetch()
+            )
+        if user.is_anonymous:
+            return queryset.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+            )
+        return queryset.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                Purchase.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+        )
 
     def get_serializer_class(self):
         """Определение класса сериализатора в зависимости от действия."""
@@ -65,7 +119,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
         )
         purchase_serializer.is_valid(raise_exception=True)
         if request.method == 'GET':
-            Purchase.objects.create(user=user, recipe=recipe)
+            with transaction.atomic():
+                Purchase.objects.create(user=user, recipe=recipe)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         else:
             purchase = get_object_or_404(Purchase, user=user, recipe=recipe)
@@ -94,7 +149,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
         )
         favorite_serializer.is_valid(raise_exception=True)
         if request.method == 'GET':
-            Favorite.objects.create(user=user, recipe=recipe)
+            with transaction.atomic():
+                Favorite.objects.create(user=user, recipe=recipe)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         else:
             favorite = get_object_or_404(Favorite, user=user, recipe=recipe)
@@ -103,26 +159,29 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     @action(
         detail=False, methods=['get'],
-        permission_classes=(IsAuthenticated,)
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=SHOPPING_CART_RENDERERS,
     )
     def download_shopping_cart(self, request):
         """Метод для скачивания списка покупок.
         В ответе будут перечислены ингредиенты,
         их общее количество и единицы измерения.
+        Формат файла выбирается параметром format: txt, csv или pdf.
+        Под ASGI файл строится в потоке пула представлений,
+        а в цикле событий готовые части только отправляются клиенту:
+        иначе построение PDF блокировало бы остальные соединения.
         """
-        user = self.request.user
-        recipes = Recipe.objects.filter(purchases__user=user)
-        ingredients = recipes.values(
-            'ingredients__name',
-            'ingredients__measurement_unit__name'
-        ).order_by('ingredients__name').annotate(
-            ingredients_total=Sum('amount_ingredients__amount')
+        renderer = request.accepted_renderer
+        ingredients = get_shopping_cart_ingredients(self.request.user)
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        if isinstance(request._request, ASGIRequest):
+            content = stream_async(list(renderer.stream(ingredients)))
+        else:
+            content = renderer.stream(ingredients.iterator())
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{renderer.format}"'
         )
-        response = ''
-        for item in ingredients:
-            response += (
-                f'{item.get("ingredients__name")} - '
-                f'{str(item.get("ingredients_total"))} '
-                f'{item["ingredients__measurement_unit__name"]}\n'
-            )
-        return HttpResponse(response, content_type='text/plain; charset=UTF-8')
+        return response
@@ -0,0 +1,61 @@
+from hashlib import sha256
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+User = get_user_model()
+
+
+def get_token_cache_key(key):
+    """Ключ кэша по хэшу токена, чтобы сам токен не попадал в кэш."""
+    return f'auth:token:{sha256(key.encode()).hexdigest()}'
+
+
+def invalidate_token(key):
+    """После фиксации текущей транзакции удаляет токен из кэша.
+    Если удалить его раньше, параллельный запрос может снова
+    сохранить в кэше ещё не изменённую строку.
+    """
+    cache_key = get_token_cache_key(key)
+    transaction.on_commit(lambda: cache.delete(cache_key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Аутентификация по токену, которая хранит в кэше Django
+    на TOKEN_CACHE_TIMEOUT секунд только id пользователя токена
+    и признак активности и не обращается к базе данных при повторных
+    запросах с тем же токеном.
+
+    Пользователь создаётся с одним загруженным полем id, остальные
+    поля, в том числе пароль, загружаются из базы данных при первом
+    обращении, а save() сохраняет только загруженные поля.
+    Запись удаляется из кэша после удаления токена (выхода) и после
+    любого сохранения пользователя, в том числе деактивации.
+    """
+
+    def authenticate_credentials(self, key):
+        timeout = settings.TOKEN_CACHE_TIMEOUT
+        if not timeout:
+            return super().authenticate_credentials(key)
+        cache_key = get_token_cache_key(key)
+        cached = cache.get(cache_key)
+        if cached is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(
+                cache_key,
+                {'user_id': user.pk, 'is_active': user.is_active},
+                timeout
+            )
+            return user, token
+        if not cached['is_active']:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.')
+            )
+        user = User.from_db(User.objects.db, ['id'], [cached['user_id']])
+        return user, self.get_model()(key=key, user=user)
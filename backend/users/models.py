@@ -37,6 +37,17 @@ class User(AbstractUser):
     def __str__(self):
         return self.get_full_name()
 
+    def refresh_from_db(self, using=None, fields=None):
+        """При обращении к отложенному полю загружает все отложенные
+        поля одним запросом. Так у пользователя из кэша токенов,
+        у которого загружено только поле id, остальные поля
+        читаются из базы данных один раз.
+        """
+        deferred_fields = self.get_deferred_fields()
+        if fields is not None and deferred_fields.issuperset(fields):
+            fields = list(deferred_fields)
+        super().refresh_from_db(using, fields)
+
 
 class Subscription(models.Model):
     """Модель Подписка на автора рецепта."""
@@ -44,12 +55,14 @@ class Subscription(models.Model):
         User,
         on_delete=models.CASCADE,
         related_name='subscribers',
+        db_index=False,
         verbose_name='Подписчик'
     )
     subscription = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='subscriptions',
+        db_index=False,
         verbose_name='Автор рецепта'
     )
 
@@ -64,6 +77,12 @@ class Subscription(models.Model):
                 name='subscribe_to_yourself'
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=['subscription', 'subscriber'],
+                name='subscription_author_idx'
+            ),
+        ]
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
 
@@ -1,12 +1,29 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
 
+from recipes.images import get_image_renditions
 from recipes.models import Recipe
 from .models import Subscription
 
 User = get_user_model()
 
 
+def get_subscribed_ids(request):
+    """Возвращает множество id авторов, на которых подписан
+    текущий пользователь. Подписки загружаются одним запросом
+    и сохраняются в объекте запроса до конца его обработки.
+    """
+    if request.user.is_anonymous:
+        return set()
+    if not hasattr(request, 'subscribed_ids'):
+        request.subscribed_ids = set(
+            Subscription.objects.filter(
+                subscriber=request.user
+            ).values_list('subscription_id', flat=True)
+        )
+    return request.subscribed_ids
+
+
 class UserSerializer(serializers.ModelSerializer):
     """Сериализатор для представления пользователя."""
     is_subscribed = serializers.SerializerMethodField()
@@ -28,20 +45,20 @@ class UserSerializer(serializers.ModelSerializer):
 
     def get_is_subscribed(self, obj):
         """Метод определяет подписан ли текущий пользователь на объект User."""
-        user = self.context['request'].user
-        if user.is_anonymous:
-            return False
-        return Subscription.objects.filter(
-            subscriber=user,
-            subscription=obj
-        ).exists()
+        return obj.id in get_subscribed_ids(self.context['request'])
 
 
 class RecipeUserSerializer(serializers.ModelSerializer):
     """Сериализатор для представления рецепта."""
+    image_renditions = serializers.SerializerMethodField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time',)
+        fields = ('id', 'name', 'image', 'image_renditions', 'cooking_time',)
+
+    def get_image_renditions(self, obj):
+        """Метод возвращает URL уменьшенных копий изображения."""
+        return get_image_renditions(obj)
 
 
 class SubscriptionSerializer(serializers.ModelSerializer):
@@ -82,21 +99,25 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         """Метод определяет подписан ли текущий
         пользователь на объект User.
         """
-        user = self.context['request'].user
-        if user.is_anonymous:
-            return False
-        return Subscription.objects.filter(
-            subscriber=user,
-            subscription=obj.subscription
-        ).exists()
+        return obj.subscription_id in get_subscribed_ids(
+            self.context['request']
+        )
 
     def get_recipes(self, obj):
-        """Метод возвращает рецепты автора."""
-        recipes = obj.subscription.recipes.all()
+        """Метод возвращает рецепты автора, загруженные
+        представлением для всей страницы подписок.
+        """
+        recipes_by_author = self.context.get('recipes_by_author')
+        if recipes_by_author is None:
+            recipes = obj.subscription.recipes.all()
+        else:
+            recipes = recipes_by_author.get(obj.subscription_id, [])
         return RecipeUserSerializer(recipes, many=True).data
 
     def get_recipes_count(self, obj):
         """Метод возвращает количество рецептов автора."""
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return obj.subscription.recipes.count()
 
     def validate(self, attrs):
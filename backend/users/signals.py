@@ -0,0 +1,25 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_token
+
+User = get_user_model()
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """Сбрасывает кэш токена при выходе пользователя."""
+    invalidate_token(instance.key)
+
+
+@receiver((post_save, post_delete), sender=User)
+def invalidate_user_tokens(sender, instance, **kwargs):
+    """Сбрасывает кэш токенов пользователя при изменении его данных,
+    в том числе признака активности.
+    """
+    for key in Token.objects.filter(user_id=instance.pk).values_list(
+            'key', flat=True
+    ):
+        invalidate_token(key)
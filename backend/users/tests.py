@@ -1,3 +1,269 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from recipes.models import Recipe
+from .authentication import CachedTokenAuthentication, get_token_cache_key
+from .models import Subscription
+
+User = get_user_model()
+
+
+class UserAPITestCase(TestCase):
+    """Общие данные для тестов API пользователей."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(
+                email=f'user{i}@example.org',
+                username=f'user{i}',
+                first_name='Имя',
+                last_name='Фамилия',
+                password='password',
+            )
+            for i in range(5)
+        ]
+        cls.user = cls.users[0]
+
+    def setUp(self):
+        self.authorized_client = APIClient()
+        self.authorized_client.force_authenticate(self.user)
+
+    def count_queries(self, client, url):
+        """Возвращает ответ и количество выполненных SQL-запросов."""
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        return response, len(context.captured_queries)
+
+
+class IsSubscribedTests(UserAPITestCase):
+    """Тесты поля is_subscribed."""
+
+    def test_is_subscribed_in_user_list(self):
+        """Поле is_subscribed отражает подписки текущего пользователя."""
+        Subscription.objects.create(
+            subscriber=self.user, subscription=self.users[1]
+        )
+        response = self.authorized_client.get('/api/users/')
+        results = {item['id']: item for item in response.json()['results']}
+        self.assertTrue(results[self.users[1].id]['is_subscribed'])
+        self.assertFalse(results[self.users[2].id]['is_subscribed'])
+
+    def test_user_list_queries_are_bounded(self):
+        """Подписки загружаются одним запросом на всю страницу."""
+        for author in self.users[1:]:
+            Subscription.objects.create(
+                subscriber=self.user, subscription=author
+            )
+        _, queries = self.count_queries(self.authorized_client, '/api/users/')
+        # COUNT, страница пользователей, подписки текущего пользователя.
+        self.assertLessEqual(queries, 3)
+
+
+class SubscriptionsTests(UserAPITestCase):
+    """Тесты списка подписок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for author in cls.users[1:]:
+            Subscription.objects.create(
+                subscriber=cls.user, subscription=author
+            )
+            for i in range(4):
+                Recipe.objects.create(
+                    author=author,
+                    name=f'Рецепт {i}',
+                    text='Описание',
+                    cooking_time=10,
+                    image='recipes/test.png',
+                )
+
+    def test_recipes_limit(self):
+        """Параметр recipes_limit ограничивает рецепты каждого автора."""
+        response = self.authorized_client.get(
+            '/api/users/subscriptions/?recipes_limit=2'
+        )
+        results = response.json()['results']
+        self.assertEqual(len(results), 4)
+        for item in results:
+            self.assertTrue(item['is_subscribed'])
+            self.assertEqual(item['recipes_count'], 4)
+            self.assertEqual(
+                [recipe['name'] for recipe in item['recipes']],
+                ['Рецепт 3', 'Рецепт 2']
+            )
+
+    def test_all_recipes_without_limit(self):
+        response = self.authorized_client.get('/api/users/subscriptions/')
+        for item in response.json()['results']:
+            self.assertEqual(len(item['recipes']), 4)
+
+    def test_subscriptions_queries_are_bounded(self):
+        """Количество запросов не зависит от числа подписок на странице."""
+        _, queries = self.count_queries(
+            self.authorized_client,
+            '/api/users/subscriptions/?recipes_limit=3'
+        )
+        # COUNT, страница подписок, рецепты авторов, подписки пользователя.
+        self.assertLessEqual(queries, 4)
+
+    def test_subscriptions_use_indexes(self):
+        """Подписки и рецепты авторов выбираются по индексам,
+        а подписчики автора - по обратному индексу.
+        """
+        with CaptureQueriesContext(connection) as context:
+            self.authorized_client.get(
+                '/api/users/subscriptions/?recipes_limit=2'
+            )
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            plans = []
+            for query in context.captured_queries:
+                cursor.execute(f'EXPLAIN {query["sql"]}')
+                plans.append('\n'.join(row[0] for row in cursor.fetchall()))
+        for plan in plans:
+            self.assertNotIn('Seq Scan', plan)
+        self.assertTrue(any(
+            'recipe_author_pub_date_idx' in plan for plan in plans
+        ))
+        self.assertIn(
+            'subscription_author_idx',
+            Subscription.objects.filter(
+                subscription=self.users[1]
+            ).values('subscriber').explain()
+        )
+
+    def test_subscriptions_cursor(self):
+        """Подписки можно получать по курсору в порядке подписки."""
+        ids, url = [], '/api/users/subscriptions/?pagination=cursor&limit=3'
+        while url:
+            response = self.authorized_client.get(url)
+            self.assertNotIn('count', response.json())
+            ids += [item['id'] for item in response.json()['results']]
+            url = response.json()['next']
+        self.assertEqual(ids, [user.id for user in self.users[1:]])
+
+    def test_subscribe_respects_recipes_limit(self):
+        """Ответ на подписку тоже учитывает recipes_limit."""
+        Subscription.objects.filter(subscription=self.users[1]).delete()
+        response = self.authorized_client.get(
+            f'/api/users/{self.users[1].id}/subscribe/?recipes_limit=1'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['recipes']), 1)
+        self.assertEqual(response.json()['recipes_count'], 4)
+
+
+@override_settings(TOKEN_CACHE_TIMEOUT=300)
+class TokenCacheTests(UserAPITestCase):
+    """Тесты кэша аутентификации по токену."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        response = APIClient().post(
+            '/api/auth/token/login/',
+            {'email': self.user.email, 'password': 'password'}
+        )
+        self.token = response.json()['auth_token']
+        self.token_client = APIClient()
+        self.token_client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def get_token_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.token_client.get(url)
+        return response, [
+            query['sql'] for query in context.captured_queries
+            if 'authtoken_token' in query['sql']
+        ]
+
+    def test_token_is_cached(self):
+        _, token_queries = self.get_token_queries('/api/users/me/')
+        self.assertEqual(len(token_queries), 1)
+        response, token_queries = self.get_token_queries('/api/users/me/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['email'], self.user.email)
+        self.assertEqual(token_queries, [])
+
+    def test_only_user_id_is_cached(self):
+        """Пароль и другие данные пользователя в кэш не попадают."""
+        self.token_client.get('/api/users/me/')
+        self.assertEqual(
+            cache.get(get_token_cache_key(self.token)),
+            {'user_id': self.user.id, 'is_active': True}
+        )
+
+    def test_cached_user_fields_are_loaded_once(self):
+        """Поля пользователя из кэша загружаются одним запросом."""
+        self.token_client.get('/api/users/me/')
+        with self.assertNumQueries(1):
+            user, _ = CachedTokenAuthentication().authenticate_credentials(
+                self.token
+            )
+            self.assertEqual(user.email, self.user.email)
+            self.assertEqual(user.username, self.user.username)
+
+    def test_logout_invalidates_token(self):
+        self.token_client.get('/api/users/me/')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.token_client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        response = self.token_client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_deactivation_invalidates_token(self):
+        self.token_client.get('/api/users/me/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        response = self.token_client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_cached_user_does_not_overwrite_changes(self):
+        """Сохранение пользователя из кэша не возвращает данные,
+        изменённые после его попадания в кэш.
+        """
+        self.token_client.get('/api/users/me/')
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        user, _ = CachedTokenAuthentication().authenticate_credentials(
+            self.token
+        )
+        user.first_name = 'Новое имя'
+        user.save()
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertEqual(self.user.first_name, 'Новое имя')
+
+    def test_password_change_with_cached_user(self):
+        self.token_client.get('/api/users/me/')
+        User.objects.filter(pk=self.user.pk).update(
+            password=make_password('0ther-pa55word')
+        )
+        response = self.token_client.post(
+            '/api/users/set_password/',
+            {'current_password': 'password', 'new_password': 'nEw-pa55word'}
+        )
+        self.assertEqual(response.status_code, 400)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.token_client.post(
+                '/api/users/set_password/',
+                {
+                    'current_password': '0ther-pa55word',
+                    'new_password': 'nEw-pa55word',
+                }
+            )
+        self.assertEqual(response.status_code, 204)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('nEw-pa55word'))
+
+    @override_settings(TOKEN_CACHE_TIMEOUT=0)
+    def test_cache_can_be_disabled(self):
+        self.token_client.get('/api/users/me/')
+        _, token_queries = self.get_token_queries('/api/users/me/')
+        self.assertEqual(len(token_queries), 1)
@@ -1,10 +1,16 @@
+from collections import defaultdict
+
 from django.contrib.auth import get_user_model
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
 from rest_framework import permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from recipes.models import Recipe
+from recipes.pagination import SubscriptionPagination
 from .models import Subscription
 from .serializers import SubscriptionSerializer, UserSerializer
 
@@ -18,10 +24,51 @@ class CustomUserViewSet(
     serializer_class = UserSerializer
     permission_classes = (permissions.IsAuthenticated,)
 
+    def get_recipes_limit(self):
+        """Возвращает значение параметра recipes_limit или None."""
+        try:
+            limit = int(self.request.query_params['recipes_limit'])
+        except (KeyError, ValueError):
+            return None
+        return max(limit, 0)
+
+    def get_recipes_by_author(self, author_ids):
+        """Загружает одним запросом не более recipes_limit последних
+        рецептов каждого из авторов и группирует их по авторам.
+        """
+        recipes = Recipe.objects.filter(author_id__in=author_ids).only(
+            'id', 'author_id', 'name', 'image', 'renditions', 'cooking_time'
+        )
+        limit = self.get_recipes_limit()
+        if limit is not None:
+            recipes = recipes.annotate(
+                row_number=Window(
+                    RowNumber(),
+                    partition_by=F('author_id'),
+                    order_by=(F('pub_date').desc(), F('id').desc()),
+                )
+            ).filter(row_number__lte=limit)
+        recipes_by_author = defaultdict(list)
+        for recipe in recipes.order_by('author_id', '-pub_date', '-id'):
+            recipes_by_author[recipe.author_id].append(recipe)
+        return recipes_by_author
+
+    def get_subscription_serializer(self, subscriptions, **kwargs):
+        """Создаёт сериализатор подписок с заранее загруженными
+        рецептами авторов.
+        """
+        instances = subscriptions if kwargs.get('many') else [subscriptions]
+        context = self.get_serializer_context()
+        context['recipes_by_author'] = self.get_recipes_by_author(
+            [subscription.subscription_id for subscription in instances]
+        )
+        return self.get_serializer(subscriptions, context=context, **kwargs)
+
     @action(
         detail=False, methods=['get'],
         queryset=Subscription.objects.all(),
-        serializer_class=SubscriptionSerializer
+        serializer_class=SubscriptionSerializer,
+        pagination_class=SubscriptionPagination
     )
     def subscriptions(self, request):
         """Метод, который позволяет получить все подписки
@@ -29,9 +76,15 @@ class CustomUserViewSet(
         """
         user = self.request.user
         subscriptions = self.paginate_queryset(
-            Subscription.objects.filter(subscriber=user)
+            Subscription.objects.filter(
+                subscriber=user
+            ).select_related('subscription').annotate(
+                recipes_count=Count('subscription__recipes')
+            ).order_by('id')
+        )
+        serializer = self.get_subscription_serializer(
+            subscriptions, many=True
         )
-        serializer = self.get_serializer(subscriptions, many=True)
         return self.get_paginated_response(serializer.data)
 
     @action(
@@ -58,7 +111,7 @@ class CustomUserViewSet(
             subscription = Subscription.objects.create(
                 subscriber=user, subscription=subscription_user
             )
-            serializer = self.get_serializer(subscription)
+            serializer = self.get_subscription_serializer(subscription)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         if request.method == 'DELETE':
             subscription = get_object_or_404(